@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.db.models.signals import m2m_changed, post_delete, post_save
 
 
 class AccountsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
-    name = "accounts"
\ No newline at end of file
+    name = "accounts"
+
+    def ready(self):
+        from django.contrib.auth import get_user_model
+        from django.contrib.auth.models import Group
+        from . import roles
+        m2m_changed.connect(roles.invalidate_roles, sender=get_user_model().groups.through, dispatch_uid='accounts.roles.membership')
+        post_save.connect(roles.invalidate_roles, sender=Group, dispatch_uid='accounts.roles.group_save')
+        post_delete.connect(roles.invalidate_roles, sender=Group, dispatch_uid='accounts.roles.group_delete')
@@ -0,0 +1,224 @@
+# accounts/audit.py
+"""
+Buffered audit log writer.
+
+AuditLoggingMixin records events with record_audit_event(); instead of an INSERT on the
+request path, events go onto a bounded in-process queue that a background thread
+flushes with bulk_create every AUDIT_LOG_BATCH_SIZE events or AUDIT_LOG_FLUSH_SECONDS,
+whichever comes first. Whatever is still queued is flushed at interpreter exit. When
+the queue is full new events are dropped and counted rather than blocking requests.
+
+With settings.AUDIT_LOG_BUFFERED = False events are written inline (tests use this).
+
+Rows older than AUDIT_LOG_RETENTION_DAYS are removed by prune_expired_audit_logs() (the
+prune_audit_log / archive_audit_log commands), in short per-batch transactions and
+optionally copied to a gzipped JSONL archive first.
+"""
+import atexit
+import datetime
+import gzip
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.utils import timezone
+
+from .models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+
+class AuditBuffer:
+    def __init__(self, max_size=None, batch_size=None, flush_interval=None):
+        self.max_size = max_size or getattr(settings, 'AUDIT_LOG_BUFFER_SIZE', 10000)
+        self.batch_size = batch_size or getattr(settings, 'AUDIT_LOG_BATCH_SIZE', 200)
+        self.flush_interval = flush_interval or getattr(settings, 'AUDIT_LOG_FLUSH_SECONDS', 2)
+        self.queue = queue.Queue(maxsize=self.max_size)
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def record(self, event):
+        """
+        Queues an unsaved AuditLog; never blocks.
+        """
+        self._ensure_thread()
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                dropped = self.dropped
+            # log the first drop and then every thousandth, not every request
+            if dropped == 1 or dropped % 1000 == 0:
+                logger.warning('Audit log buffer full (%d events); %d event(s) dropped so far', self.max_size, dropped)
+
+    def stats(self):
+        return {
+            'queued': self.queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+        }
+
+    def _ensure_thread(self):
+        # a forked worker inherits the object but not the thread
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+                self._thread.start()
+
+    def _take(self, timeout):
+        batch = []
+        deadline = time.monotonic() + timeout
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                batch = self._take(self.flush_interval)
+                if batch:
+                    self._write(batch)
+                    close_old_connections()
+        finally:
+            connections.close_all()
+
+    def _write(self, batch):
+        try:
+            AuditLog.objects.bulk_create(batch, batch_size=self.batch_size)
+        except Exception:
+            logger.exception('Could not write %d audit event(s)', len(batch))
+            with self._lock:
+                self.failed += len(batch)
+        else:
+            with self._lock:
+                self.written += len(batch)
+
+    def flush(self):
+        """
+        Writes everything queued so far from the calling thread.
+        """
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._write(batch)
+
+    def shutdown(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+        self.flush()
+        if self.dropped or self.failed:
+            logger.warning('Audit log writer stopped: %s', self.stats())
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_audit_buffer():
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = AuditBuffer()
+            atexit.register(_buffer.shutdown)
+        return _buffer
+
+
+def record_audit_event(actor, action, model, object_id='', details=''):
+    event = AuditLog(
+        actor=actor,
+        action=action,
+        model=model,
+        object_id=object_id,
+        details=details,
+        timestamp=timezone.now(),
+    )
+    if getattr(settings, 'AUDIT_LOG_BUFFERED', True):
+        get_audit_buffer().record(event)
+    else:
+        event.save()
+
+
+# ---------- retention ----------
+
+DEFAULT_AUDIT_LOG_RETENTION_DAYS = 365
+DEFAULT_AUDIT_LOG_PRUNE_BATCH_SIZE = 5000
+
+ARCHIVE_FIELDS = ['id', 'timestamp', 'actor_id', 'actor__username', 'action', 'model', 'object_id', 'details']
+
+
+def audit_log_cutoff(days=None, now=None):
+    """
+    Returns the timestamp before which rows are expired, or None when retention is
+    disabled (0 days).
+    """
+    if days is None:
+        days = getattr(settings, 'AUDIT_LOG_RETENTION_DAYS', DEFAULT_AUDIT_LOG_RETENTION_DAYS)
+    if not days:
+        return None
+    return (now or timezone.now()) - datetime.timedelta(days=days)
+
+
+def _archive_line(row):
+    record = dict(zip(ARCHIVE_FIELDS, row))
+    record['actor'] = record.pop('actor__username')
+    record['timestamp'] = record['timestamp'].isoformat()
+    return json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def prune_expired_audit_logs(before, batch_size=None, archive_path=None, pause=0):
+    """
+    Deletes audit rows with timestamp < `before`, oldest first, `batch_size` rows per
+    transaction so no lock is held for long. With `archive_path` each batch is appended
+    to that gzipped JSONL file (one gzip member per batch) before it is deleted.
+    Returns the number of rows removed.
+    """
+    batch_size = batch_size or getattr(settings, 'AUDIT_LOG_PRUNE_BATCH_SIZE', DEFAULT_AUDIT_LOG_PRUNE_BATCH_SIZE)
+    expired = AuditLog.objects.filter(timestamp__lt=before).order_by('timestamp', 'pk')
+    removed = 0
+    while True:
+        with transaction.atomic():
+            if archive_path:
+                rows = list(expired.values_list(*ARCHIVE_FIELDS)[:batch_size])
+                pks = [row[0] for row in rows]
+            else:
+                pks = list(expired.values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                return removed
+            if archive_path:
+                # written and closed before the delete commits, so a crash can only
+                # duplicate archived rows, never lose them
+                with gzip.open(archive_path, 'at', encoding='utf-8') as archive:
+                    archive.write(''.join(_archive_line(row) for row in rows))
+            AuditLog.objects.filter(pk__in=pks).delete()
+        removed += len(pks)
+        if pause:
+            time.sleep(pause)
@@ -2,6 +2,9 @@ from .mixins import is_admin
 
 def is_admin_flag(request):
     try:
+        roles = getattr(request, 'roles', None)
+        if roles is not None:
+            return { 'is_admin': roles.is_admin }
         return { 'is_admin': is_admin(request.user) }
     except Exception:
         return { 'is_admin': False }
\ No newline at end of file
@@ -0,0 +1,18 @@
+import os
+
+from django.conf import settings
+from accounts.management.commands.prune_audit_log import Command as PruneCommand
+
+
+class Command(PruneCommand):
+    help = (
+        "Move audit log rows older than the retention period into a gzipped JSONL archive "
+        "(AUDIT_LOG_ARCHIVE_DIR), in small batches."
+    )
+
+    def get_archive_path(self, options, cutoff):
+        if options['archive']:
+            return options['archive']
+        directory = getattr(settings, 'AUDIT_LOG_ARCHIVE_DIR', '') or '.'
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, f'auditlog-before-{cutoff:%Y%m%d}.jsonl.gz')
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from accounts.audit import audit_log_cutoff, prune_expired_audit_logs
+from accounts.models import AuditLog
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete audit log rows older than the retention period (AUDIT_LOG_RETENTION_DAYS) "
+        "in small batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Keep this many days (default: AUDIT_LOG_RETENTION_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=None, help='Rows deleted per transaction')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between batches')
+        parser.add_argument('--archive', default=None, help='Append removed rows to this .jsonl.gz file first')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many rows are expired')
+
+    def get_archive_path(self, options, cutoff):
+        return options['archive']
+
+    def handle(self, *args, **options):
+        cutoff = audit_log_cutoff(options['days'])
+        if cutoff is None:
+            raise CommandError('Audit log retention is disabled (0 days); pass --days to prune anyway.')
+        if options['dry_run']:
+            count = AuditLog.objects.filter(timestamp__lt=cutoff).count()
+            self.stdout.write(f'{count} audit log row(s) older than {cutoff:%Y-%m-%d %H:%M}.')
+            return
+        archive_path = self.get_archive_path(options, cutoff)
+        removed = prune_expired_audit_logs(
+            cutoff, batch_size=options['batch_size'], archive_path=archive_path, pause=options['pause'],
+        )
+        message = f'Removed {removed} audit log row(s) older than {cutoff:%Y-%m-%d %H:%M}'
+        if archive_path and removed:
+            message += f'; archived to {archive_path}'
+        self.stdout.write(self.style.SUCCESS(message + '.'))
@@ -0,0 +1,14 @@
+from .roles import RequestRoles
+
+
+class RoleMiddleware:
+    """
+    Attaches request.roles, resolved on first use (see accounts.roles).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.roles = RequestRoles(request)
+        return self.get_response(request)
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['timestamp'], name='auditlog_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['actor', 'timestamp'], name='auditlog_actor_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['model', 'object_id'], name='auditlog_model_object_idx'),
+        ),
+    ]
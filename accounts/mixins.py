@@ -8,11 +8,13 @@ from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_protect
 from django.db.models import QuerySet
 
-from .models import AuditLog
+from .audit import record_audit_event
+from .roles import user_is_admin
 
 
 def is_admin(user) -> bool:
-    return user.is_authenticated and user.groups.filter(name="Admin").exists()
+    # group names are loaded once per request (see accounts.roles)
+    return user.is_authenticated and user_is_admin(user)
 
 
 class SuperuserRequiredMixin(UserPassesTestMixin):
@@ -30,7 +32,7 @@ class AuditLoggingMixin:
                 obj_id = ""
                 if hasattr(self, "object") and getattr(self, "object", None):
                     obj_id = str(self.object.pk)
-                AuditLog.objects.create(
+                record_audit_event(
                     actor=request.user,
                     action=action,
                     model=model,
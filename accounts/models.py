@@ -21,6 +21,11 @@ class AuditLog(models.Model):
 
     class Meta:
         ordering = ["-timestamp"]
+        indexes = [
+            models.Index(fields=["timestamp"], name="auditlog_timestamp_idx"),
+            models.Index(fields=["actor", "timestamp"], name="auditlog_actor_time_idx"),
+            models.Index(fields=["model", "object_id"], name="auditlog_model_object_idx"),
+        ]
 
     def __str__(self):
         return f"{self.timestamp} {self.actor} {self.action} {self.model}:{self.object_id}"
@@ -0,0 +1,87 @@
+# accounts/roles.py
+"""
+Role resolution, done once per request.
+
+user_group_names() loads a user's group names with one query and memoizes them on the
+user object, which AuthenticationMiddleware builds fresh for every request, so the
+context processor and the view mixins share a single lookup. With ROLE_CACHE_SECONDS
+set the names are also kept in the cache between requests under a version stamp that
+any group or membership change bumps. accounts.middleware.RoleMiddleware exposes the
+lazy result as request.roles.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import cached_property
+
+from rumipress.versioning import bump_cache_version, cache_version
+
+ADMIN_GROUP = 'Admin'
+ROLES_VERSION_KEY = 'accounts:roles:version'
+
+_MEMO_ATTR = '_role_group_names'
+
+
+def roles_version():
+    return cache_version(ROLES_VERSION_KEY)
+
+
+def _load_group_names(user):
+    return frozenset(user.groups.values_list('name', flat=True))
+
+
+def user_group_names(user):
+    """
+    Returns the names of the user's groups (empty for anonymous users).
+    """
+    if not user.is_authenticated:
+        return frozenset()
+    names = getattr(user, _MEMO_ATTR, None)
+    if names is not None:
+        return names
+    timeout = getattr(settings, 'ROLE_CACHE_SECONDS', 0)
+    if timeout:
+        key = f'accounts:roles:{user.pk}'
+        version = roles_version()
+        names = cache.get(key, version=version)
+        if names is None:
+            names = _load_group_names(user)
+            cache.set(key, names, timeout, version=version)
+    else:
+        names = _load_group_names(user)
+    setattr(user, _MEMO_ATTR, names)
+    return names
+
+
+def user_is_admin(user):
+    return ADMIN_GROUP in user_group_names(user)
+
+
+def invalidate_roles(sender=None, instance=None, **kwargs):
+    """
+    Makes every cached role set stale, now and after commit; connected to group
+    membership changes and group saves/deletes.
+    """
+    action = kwargs.get('action')
+    if action is not None and not action.startswith('post_'):
+        return
+    if instance is not None and hasattr(instance, _MEMO_ATTR):
+        delattr(instance, _MEMO_ATTR)
+    bump_cache_version(ROLES_VERSION_KEY)
+
+
+class RequestRoles:
+    """
+    Lazy per-request view of the current user's roles.
+    """
+
+    def __init__(self, request):
+        self.request = request
+
+    @cached_property
+    def names(self):
+        return user_group_names(self.request.user)
+
+    @cached_property
+    def is_admin(self):
+        return ADMIN_GROUP in self.names
+
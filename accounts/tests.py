@@ -1,8 +1,25 @@
-from django.test import TestCase
+import datetime
+import gzip
+import json
+import os
+import tempfile
+import time
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth.models import User, Group
 from distribution.models import Book, Category
 
+from accounts.audit import AuditBuffer
+from accounts.mixins import is_admin
+from accounts.models import AuditLog
+
 
 class RBACPermissionsTests(TestCase):
     def setUp(self):
@@ -78,4 +95,126 @@ class RBACPermissionsTests(TestCase):
             "password": "AdminPass123!",
         })
         self.assertEqual(resp.status_code, 200)
-        self.assertIn(b"deactivated by the Superadmin", resp.content)
\ No newline at end of file
+        self.assertIn(b"deactivated by the Superadmin", resp.content)
+
+
+class AuditBufferTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user("auditor", "au@example.com", "AdminPass123!")
+        self.admin.groups.add(Group.objects.get_or_create(name="Admin")[0])
+
+    def event(self, n=0):
+        return AuditLog(actor=self.admin, action="read", model="Book", object_id=str(n))
+
+    def test_admin_read_is_recorded(self):
+        self.client.login(username="auditor", password="AdminPass123!")
+        self.client.get(reverse("distribution:book_list"))
+        self.assertTrue(AuditLog.objects.filter(actor=self.admin, action="read").exists())
+
+    def test_flush_writes_queued_events_in_batches(self):
+        buffer = AuditBuffer(max_size=100, batch_size=3)
+        for n in range(7):
+            buffer.queue.put_nowait(self.event(n))
+        with self.assertNumQueries(3):
+            buffer.flush()
+        self.assertEqual(AuditLog.objects.count(), 7)
+        self.assertEqual(buffer.stats(), {'queued': 0, 'written': 7, 'dropped': 0, 'failed': 0})
+
+    def test_overflow_is_counted_not_blocking(self):
+        buffer = AuditBuffer(max_size=2, flush_interval=60)
+        buffer._ensure_thread = lambda: None
+        with self.assertLogs('accounts.audit', 'WARNING'):
+            for n in range(5):
+                buffer.record(self.event(n))
+        self.assertEqual(buffer.stats()['queued'], 2)
+        self.assertEqual(buffer.dropped, 3)
+
+
+class AuditBufferThreadTests(TransactionTestCase):
+    def test_background_thread_flushes_on_interval(self):
+        admin = User.objects.create_user("auditor", "au@example.com", "AdminPass123!")
+        buffer = AuditBuffer(max_size=100, batch_size=50, flush_interval=0.05)
+        for n in range(3):
+            buffer.record(AuditLog(actor=admin, action="read", model="Book", object_id=str(n)))
+        deadline = time.monotonic() + 5
+        while buffer.written < 3 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        buffer.shutdown()
+        self.assertEqual(AuditLog.objects.count(), 3)
+        self.assertEqual(buffer.stats()['queued'], 0)
+
+
+class AuditRetentionTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user("auditor", "au@example.com", "AdminPass123!")
+        now = timezone.now()
+        AuditLog.objects.bulk_create([
+            AuditLog(actor=self.admin, action="read", model="Book", object_id=str(n),
+                     timestamp=now - datetime.timedelta(days=400 + n))
+            for n in range(5)
+        ] + [
+            AuditLog(actor=self.admin, action="update", model="Book", object_id="9",
+                     timestamp=now - datetime.timedelta(days=10)),
+        ])
+
+    def test_prune_removes_only_expired_rows_in_batches(self):
+        out = StringIO()
+        with self.settings(AUDIT_LOG_RETENTION_DAYS=365):
+            call_command("prune_audit_log", "--batch-size", "2", stdout=out)
+        self.assertIn("Removed 5", out.getvalue())
+        self.assertEqual(list(AuditLog.objects.values_list("object_id", flat=True)), ["9"])
+
+    def test_dry_run_deletes_nothing(self):
+        out = StringIO()
+        call_command("prune_audit_log", "--days", "30", "--dry-run", stdout=out)
+        self.assertIn("5 audit log row(s)", out.getvalue())
+        self.assertEqual(AuditLog.objects.count(), 6)
+
+    def test_archive_writes_jsonl_before_deleting(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "audit.jsonl.gz")
+            call_command("archive_audit_log", "--days", "365", "--batch-size", "2", "--archive", path, stdout=StringIO())
+            with gzip.open(path, "rt", encoding="utf-8") as archive:
+                records = [json.loads(line) for line in archive]
+        self.assertEqual(sorted(r["object_id"] for r in records), ["0", "1", "2", "3", "4"])
+        self.assertEqual(records[0]["actor"], "auditor")
+        self.assertEqual(AuditLog.objects.count(), 1)
+
+    def test_archive_defaults_to_archive_dir(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with self.settings(AUDIT_LOG_ARCHIVE_DIR=directory):
+                call_command("archive_audit_log", "--days", "365", stdout=StringIO())
+            self.assertEqual(len(os.listdir(directory)), 1)
+
+
+class RoleResolutionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.group, _ = Group.objects.get_or_create(name="Admin")
+        self.admin = User.objects.create_user("roleadmin", "ra@example.com", "AdminPass123!")
+        self.admin.groups.add(self.group)
+
+    def group_queries(self, queries):
+        return [q for q in queries if '"auth_group"' in q["sql"]]
+
+    def test_page_view_resolves_roles_once(self):
+        self.client.login(username="roleadmin", password="AdminPass123!")
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(reverse("distribution:book_list"))
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.context["is_admin"])
+        self.assertEqual(len(self.group_queries(ctx.captured_queries)), 1)
+
+    def test_membership_change_clears_memo(self):
+        self.assertTrue(is_admin(self.admin))
+        self.admin.groups.remove(self.group)
+        self.assertFalse(is_admin(self.admin))
+
+    def test_cached_roles_are_invalidated_by_membership_changes(self):
+        with self.settings(ROLE_CACHE_SECONDS=300):
+            self.assertTrue(is_admin(User.objects.get(pk=self.admin.pk)))
+            with self.assertNumQueries(1):
+                # the user row only; group names come from the cache
+                self.assertTrue(is_admin(User.objects.get(pk=self.admin.pk)))
+            self.group.user_set.remove(self.admin)
+            self.assertFalse(is_admin(User.objects.get(pk=self.admin.pk)))
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category, Book
+from .models import Category, Book, ImportJob
 
 # Register your models here.
 @admin.register(Category)
@@ -13,4 +13,10 @@ class BookAdmin(admin.ModelAdmin):
     list_filter = ('category',)
     search_fields = ('title', 'author')
     date_hierarchy = 'publishing_date'
-    
\ No newline at end of file
+    
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('filename', 'status', 'rows_processed', 'books_created', 'books_updated', 'rows_skipped', 'created_by', 'created_at')
+    list_filter = ('status',)
+    readonly_fields = ('started_at', 'finished_at')
@@ -1,6 +1,26 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
+
+
+def install_search_index(sender, using, **kwargs):
+    from .search import install_search_index
+    install_search_index(using)
 
 
 class DistributionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'distribution'
+
+    def ready(self):
+        from . import choices, reports, rollups
+        Book = self.get_model('Book')
+        Category = self.get_model('Category')
+        post_migrate.connect(install_search_index, sender=self, dispatch_uid='distribution.install_search_index')
+        pre_save.connect(rollups.book_pre_save, sender=Book, dispatch_uid='distribution.rollups.pre_save')
+        post_save.connect(rollups.book_post_save, sender=Book, dispatch_uid='distribution.rollups.post_save')
+        post_delete.connect(rollups.book_post_delete, sender=Book, dispatch_uid='distribution.rollups.post_delete')
+        # book writes bump the report version through the rollups; category renames here
+        post_save.connect(reports.bump_report_version, sender=Category, dispatch_uid='distribution.reports.category_save')
+        post_delete.connect(reports.bump_report_version, sender=Category, dispatch_uid='distribution.reports.category_delete')
+        post_save.connect(choices.bump_category_choices, sender=Category, dispatch_uid='distribution.choices.category_save')
+        post_delete.connect(choices.bump_category_choices, sender=Category, dispatch_uid='distribution.choices.category_delete')
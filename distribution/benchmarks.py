@@ -0,0 +1,199 @@
+# distribution/benchmarks.py
+"""
+Benchmark suite for the hot paths: the importer, the book and category lists with each
+filter/sort, the expense report endpoints and the bulk deletes.
+
+run_suite() works on the current database (normally a throwaway test database set up by
+`manage.py run_benchmarks`); anything a benchmark writes is rolled back, so every
+repetition sees the same data. Each result records min/median/max wall time and the
+number of queries of one run; compare_results() diffs two result files.
+"""
+import datetime
+import platform
+import statistics
+import subprocess
+import time
+from contextlib import contextmanager, nullcontext
+
+import django
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import Book, Category
+from .synthetic import CatalogueGenerator
+from .views import BookListView
+
+BOOK_SORTS = ['title', 'author', 'publisher', 'category', 'distribution_expenses', 'publishing_date']
+
+
+@contextmanager
+def rolled_back():
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def measure(name, run, repeat=5, setup=None, rollback=False):
+    """
+    Times `run()` `repeat` times (after `setup()` each time, untimed) and returns the
+    result entry.
+    """
+    timings = []
+    queries = 0
+    for _ in range(repeat):
+        with rolled_back() if rollback else nullcontext():
+            if setup is not None:
+                setup()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                run()
+                timings.append((time.perf_counter() - started) * 1000)
+            queries = len(captured.captured_queries)
+    return {
+        'name': name,
+        'repeat': repeat,
+        'min_ms': round(min(timings), 2),
+        'median_ms': round(statistics.median(timings), 2),
+        'max_ms': round(max(timings), 2),
+        'queries': queries,
+    }
+
+
+def _get(client, url, params=None):
+    def run():
+        response = client.get(url, params or {})
+        assert response.status_code == 200, f'{url} {params}: {response.status_code}'
+        if response.streaming:
+            b''.join(response)
+    return run
+
+
+def _post(client, url, data):
+    def run():
+        response = client.post(url, data)
+        assert response.status_code in (200, 302), f'{url}: {response.status_code}'
+    return run
+
+
+def import_frame(rows, start, categories, seed=1):
+    import pandas as pd
+    generator = CatalogueGenerator(categories, books_hint=rows, seed=seed)
+    return pd.DataFrame(
+        [[*row[:5], row[5].isoformat() if row[5] else None, *row[6:]] for row in generator.rows(rows, start=start)],
+        columns=['id', 'title', 'subtitle', 'authors', 'publisher', 'published_date', 'category', 'distribution_expense'],
+    )
+
+
+def run_suite(user, import_sizes=(10000, 100000), repeat=5, progress=None):
+    """
+    Runs every benchmark against the current database, logged in as `user` (a
+    superuser), and returns the result entries.
+    """
+    from .importer import import_books_from_dataframe
+    client = Client()
+    client.force_login(user)
+    results = []
+
+    def add(entry):
+        results.append(entry)
+        if progress is not None:
+            progress(entry)
+
+    categories = list(Category.objects.values_list('name', flat=True)) or ['Fiction']
+    for size in import_sizes:
+        frame = import_frame(size, start=10_000_000, categories=categories)
+        add(measure(
+            f'importer:{size}_rows', lambda: import_books_from_dataframe(frame, created_by=user),
+            repeat=1, rollback=True,
+        ))
+
+    book_list = reverse('distribution:book_list')
+    largest = Category.objects.annotate(n=Count('books')).order_by('-n').values_list('pk', flat=True).first()
+    dates = Book.objects.filter(publishing_date__isnull=False).order_by('publishing_date').values_list('publishing_date', flat=True)
+    middle = dates[dates.count() // 2] if dates.exists() else datetime.date(2000, 1, 1)
+    add(measure('book_list:default', _get(client, book_list), repeat))
+    for sort in BOOK_SORTS:
+        for direction in ('asc', 'desc'):
+            add(measure(f'book_list:sort={sort}:{direction}', _get(client, book_list, {'sort': sort, 'dir': direction}), repeat))
+    filters = {
+        'category': {'category': largest},
+        'date_range': {'start': middle.replace(month=1, day=1).isoformat(), 'end': middle.replace(month=12, day=31).isoformat()},
+        'search': {'q': 'river'},
+        'middle_page': {'page': max(1, Book.objects.count() // BookListView.paginate_by // 2)},
+    }
+    for label, params in filters.items():
+        add(measure(f'book_list:{label}', _get(client, book_list, params), repeat))
+
+    category_list = reverse('distribution:category_list')
+    add(measure('category_list:default', _get(client, category_list), repeat))
+    add(measure('category_list:sort=total_expense', _get(client, category_list, {'sort': 'total_expense', 'dir': 'desc'}), repeat))
+
+    expenses = reverse('distribution:expenses_by_category_json')
+    year = {'start_date': f'{middle.year}-01-01', 'end_date': f'{middle.year}-12-31'}
+    add(measure('expense_json:all:cold', _get(client, expenses), repeat, setup=cache.clear))
+    add(measure('expense_json:year:cold', _get(client, expenses, year), repeat, setup=cache.clear))
+    add(measure('expense_json:year:warm', _get(client, expenses, year), repeat))
+    analytics = reverse('distribution:expense_analytics_json')
+    add(measure('expense_analytics:category,month:cold', _get(client, analytics, {'group_by': 'category,month', **year}), repeat, setup=cache.clear))
+    add(measure('expense_analytics:publisher:top10:cold', _get(client, analytics, {'group_by': 'publisher', 'top': 10}), repeat, setup=cache.clear))
+
+    add(measure(
+        'bulk_delete:books_in_largest_category',
+        _post(client, reverse('distribution:book_bulk_delete'), {'scope': 'filtered', 'next': f'category={largest}'}),
+        repeat=1, rollback=True,
+    ))
+    empty_ids = []
+
+    def make_empty_categories():
+        # stays under DATA_UPLOAD_MAX_NUMBER_FIELDS with the used categories added
+        created = Category.objects.bulk_create([Category(name=f'benchmark empty {n}') for n in range(900)])
+        empty_ids[:] = [c.pk for c in created] + list(Category.objects.values_list('pk', flat=True)[:50])
+
+    add(measure(
+        'bulk_delete:900_empty_categories',
+        lambda: _post(client, reverse('distribution:category_bulk_delete'), {'selected': empty_ids})(),
+        repeat=1, rollback=True, setup=make_empty_categories,
+    ))
+    return results
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True, timeout=5,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def suite_metadata():
+    return {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'revision': _git_revision(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'books': Book.objects.count(),
+        'categories': Category.objects.count(),
+    }
+
+
+def compare_results(old, new, threshold=0.2):
+    """
+    Returns (name, old median, new median, relative change, regressed) for benchmarks
+    present in both result sets; `regressed` when the median grew by more than
+    `threshold`.
+    """
+    before = {entry['name']: entry for entry in old['results']}
+    rows = []
+    for entry in new['results']:
+        previous = before.get(entry['name'])
+        if previous is None:
+            continue
+        change = (entry['median_ms'] - previous['median_ms']) / previous['median_ms'] if previous['median_ms'] else 0.0
+        rows.append((entry['name'], previous['median_ms'], entry['median_ms'], change, change > threshold))
+    return rows
@@ -0,0 +1,90 @@
+# distribution/bulk.py
+"""
+Set-based bulk deletes for the list screens.
+
+These bypass the deletion collector (and with it the per-row signals), so each one
+does the bookkeeping those signals would have done: removing the dependent rollup
+rows, adjusting category totals and invalidating cached reports.
+
+Books are deleted in chunks of BOOK_DELETE_CHUNK_SIZE primary keys, each in its own
+transaction, so a large delete never holds the write lock for long.
+"""
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import DO_NOTHING, Exists, OuterRef
+from django.db.models.signals import pre_delete
+
+from .choices import bump_category_choices
+from .models import Book, Category, CategoryRollup, MonthlyCategoryExpense
+from .reports import bump_report_version
+from .rollups import RollupDeltas, deferred_rollups
+
+DEFAULT_BOOK_DELETE_CHUNK_SIZE = 2000
+
+
+def _has_books():
+    return Exists(Book.objects.filter(category_id=OuterRef('pk')))
+
+
+def delete_empty_categories(queryset):
+    """
+    Deletes the categories in `queryset` that have no books, with one DELETE whose
+    NOT EXISTS guard re-checks that at delete time. Returns (number deleted, names of
+    the categories kept because books still reference them).
+    """
+    rows = list(queryset.annotate(has_books=_has_books()).order_by('name').values_list('pk', 'name', 'has_books'))
+    protected = [name for _, name, has_books in rows if has_books]
+    candidates = [pk for pk, _, has_books in rows if not has_books]
+    if not candidates:
+        return 0, protected
+    using = router.db_for_write(Category)
+    with transaction.atomic(using=using):
+        deleted = Category.objects.filter(pk__in=candidates).filter(~_has_books())._raw_delete(using)
+        gone = ~Exists(Category.objects.filter(pk=OuterRef('category_id')))
+        CategoryRollup.objects.filter(category_id__in=candidates).filter(gone)._raw_delete(using)
+        MonthlyCategoryExpense.objects.filter(category_id__in=candidates).filter(gone)._raw_delete(using)
+        bump_report_version()
+        bump_category_choices()
+    if deleted < len(candidates):
+        # books were added to some of them since the check above
+        kept = set(Category.objects.filter(pk__in=candidates).values_list('name', flat=True))
+        protected = sorted(set(protected) | kept)
+    return deleted, protected
+
+
+def _needs_collector(model):
+    # rows pointing at the model (cascades, SET_NULL, ...) or pre_delete receivers need
+    # Django's deletion collector; the rollup post_delete receiver is replaced by deltas
+    return pre_delete.has_listeners(model) or any(
+        rel.on_delete is not DO_NOTHING for rel in model._meta.related_objects
+    )
+
+
+def delete_books(queryset, chunk_size=None):
+    """
+    Deletes every book in `queryset`, walking it in ascending pk order one chunk per
+    transaction, and keeps the category rollups and monthly buckets in step. Returns
+    the number of books deleted.
+    """
+    chunk_size = chunk_size or getattr(settings, 'BOOK_DELETE_CHUNK_SIZE', DEFAULT_BOOK_DELETE_CHUNK_SIZE)
+    using = router.db_for_write(Book)
+    raw = not _needs_collector(Book)
+    pks = queryset.order_by('pk').values_list('pk', flat=True)
+    deleted = 0
+    last = None
+    while True:
+        chunk = list((pks if last is None else pks.filter(pk__gt=last))[:chunk_size])
+        if not chunk:
+            return deleted
+        last = chunk[-1]
+        books = Book.objects.filter(pk__in=chunk)
+        with transaction.atomic(using=using):
+            if raw:
+                deltas = RollupDeltas()
+                for row in books.select_for_update().values_list('category_id', 'distribution_expenses', 'publishing_date'):
+                    deltas.remove(*row)
+                deleted += books._raw_delete(using)
+                deltas.apply()
+            else:
+                with deferred_rollups():
+                    deleted += books.delete()[0]
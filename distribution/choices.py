@@ -0,0 +1,90 @@
+# distribution/choices.py
+"""
+Category choices for the book list filter and the book form.
+
+category_choices() returns the (id, name) pairs ordered by name, cached under a version
+stamp that every category write bumps: the post_save/post_delete receivers, and the
+set-based paths that skip them (the importer's bulk_create, delete_empty_categories,
+the synthetic catalogue) call bump_category_choices() themselves.
+
+Past CATEGORY_SELECT_LIMIT categories no list is kept at all (category_choices()
+returns None) and the pages switch to CategoryTypeaheadInput, which looks names up
+through the category search endpoint as the user types.
+"""
+from django import forms
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+
+from rumipress.versioning import bump_cache_version, cache_version
+
+from .models import Category
+
+CATEGORY_CHOICES_VERSION_KEY = 'categories:choices:version'
+DEFAULT_CATEGORY_SELECT_LIMIT = 1000
+DEFAULT_CATEGORY_SEARCH_LIMIT = 20
+
+
+def category_choices_version():
+    return cache_version(CATEGORY_CHOICES_VERSION_KEY)
+
+
+def bump_category_choices(**kwargs):
+    """
+    Makes the cached choices stale, now and after commit. Also usable as a signal
+    receiver.
+    """
+    bump_cache_version(CATEGORY_CHOICES_VERSION_KEY)
+
+
+def _load_choices(limit):
+    # the count keeps a huge table from being read just to find out it is too big
+    if Category.objects.count() > limit:
+        return None
+    return list(Category.objects.order_by('name').values_list('pk', 'name'))
+
+
+def category_choices():
+    """
+    Returns [(id, name), ...] ordered by name, or None past CATEGORY_SELECT_LIMIT.
+    """
+    limit = getattr(settings, 'CATEGORY_SELECT_LIMIT', DEFAULT_CATEGORY_SELECT_LIMIT)
+    key = f'categories:choices:{limit}'
+    version = category_choices_version()
+    entry = cache.get(key, version=version)
+    if entry is None:
+        # wrapped so a cached None (too many) is told apart from a miss
+        entry = (_load_choices(limit),)
+        cache.set(key, entry, getattr(settings, 'CATEGORY_CHOICES_CACHE_SECONDS', 3600), version=version)
+    return entry[0]
+
+
+def search_categories(term, limit=None):
+    """
+    Returns up to `limit` (id, name) pairs whose name contains `term`, names starting
+    with it first.
+    """
+    limit = min(limit or DEFAULT_CATEGORY_SEARCH_LIMIT, DEFAULT_CATEGORY_SEARCH_LIMIT * 5)
+    term = term.strip()
+    qs = Category.objects.order_by('name')
+    if not term:
+        return list(qs.values_list('pk', 'name')[:limit])
+    found = list(qs.filter(name__istartswith=term).values_list('pk', 'name')[:limit])
+    if len(found) < limit:
+        found += qs.filter(name__icontains=term).exclude(name__istartswith=term).values_list('pk', 'name')[:limit - len(found)]
+    return found
+
+
+class CategoryTypeaheadInput(forms.Widget):
+    """
+    Hidden category id plus a text box that suggests names from the search endpoint.
+    """
+    template_name = 'distribution/widgets/category_typeahead.html'
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        label = ''
+        if value not in (None, '') and str(value).isdigit():
+            label = Category.objects.filter(pk=value).values_list('name', flat=True).first() or ''
+        context['widget'].update(label=label, search_url=reverse('distribution:category_search_json'))
+        return context
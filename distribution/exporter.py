@@ -0,0 +1,174 @@
+# distribution/exporter.py
+"""
+Streaming book exports in the importer's column layout, so an export can be edited
+and imported again.
+
+Rows are read with values_list().iterator(chunk_size) and written out as they arrive:
+CSV in blocks of rows, XLSX as a zip written on the fly (inline-string sheet XML, no
+shared strings table), so memory stays flat however many books match.
+"""
+import csv
+import datetime
+import io
+import re
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+
+DEFAULT_EXPORT_CHUNK_SIZE = 2000
+
+# (header, values_list field); headers are the importer's canonical column names
+EXPORT_COLUMNS = [
+    ('id', 'source_id'),
+    ('title', 'title'),
+    ('subtitle', 'subtitle'),
+    ('authors', 'author'),
+    ('publisher', 'publisher'),
+    ('published_date', 'publishing_date'),
+    ('category', 'category__name'),
+    ('distribution_expense', 'distribution_expenses'),
+]
+
+
+def iter_export_rows(queryset, chunk_size=None):
+    chunk_size = chunk_size or getattr(settings, 'BOOK_EXPORT_CHUNK_SIZE', DEFAULT_EXPORT_CHUNK_SIZE)
+    fields = [field for _, field in EXPORT_COLUMNS]
+    return queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+
+
+# rows per chunk handed to the response; one chunk per row costs more than the rows
+ROWS_PER_WRITE = 500
+
+
+class _Echo:
+    """
+    File-like object whose write() returns the value, for csv.writer.
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(_Echo())
+    pending = [writer.writerow([header for header, _ in EXPORT_COLUMNS])]
+    for row in rows:
+        pending.append(writer.writerow([
+            value.isoformat() if isinstance(value, datetime.date) else value
+            for value in row
+        ]))
+        if len(pending) >= ROWS_PER_WRITE:
+            yield ''.join(pending)
+            pending = []
+    yield ''.join(pending)
+
+
+# ---------- XLSX ----------
+
+# control characters other than tab/newline aren't allowed in XML
+XML_ILLEGAL_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Books" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+class _ChunkBuffer(io.RawIOBase):
+    """
+    Write-only, unseekable sink collecting what zipfile writes until it is drained.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _xlsx_cell(value):
+    if value is None or value == '':
+        return '<c/>'
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return f'<c t="n"><v>{value}</v></c>'
+    if isinstance(value, datetime.date):
+        value = value.isoformat()
+    text = XML_ILLEGAL_RE.sub('', str(value))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(text)}</t></is></c>'
+
+
+def _xlsx_row(values):
+    return '<row>' + ''.join(_xlsx_cell(v) for v in values) + '</row>'
+
+
+def iter_xlsx(rows):
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, xml in XLSX_PARTS.items():
+            zf.writestr(name, xml)
+        yield buffer.drain()
+        with zf.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_xlsx_row([header for header, _ in EXPORT_COLUMNS]).encode('utf-8'))
+            pending = []
+            for row in rows:
+                pending.append(_xlsx_row(row))
+                if len(pending) >= ROWS_PER_WRITE:
+                    sheet.write(''.join(pending).encode('utf-8'))
+                    pending = []
+                    yield buffer.drain()
+            sheet.write(''.join(pending).encode('utf-8'))
+            sheet.write(b'</sheetData></worksheet>')
+    yield buffer.drain()
+
+
+EXPORT_FORMATS = {
+    'csv': (iter_csv, 'text/csv; charset=utf-8', 'csv'),
+    'xlsx': (iter_xlsx, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
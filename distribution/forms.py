@@ -1,5 +1,6 @@
 # distribution/forms.py
 from django import forms
+from .choices import CategoryTypeaheadInput, category_choices
 from .models import Category, Book
 
 # ---------- Helper to apply Bootstrap classes ----------
@@ -61,6 +62,14 @@ class BookForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        # cached (id, name) pairs instead of a Category query per render; submitted ids
+        # are still checked against the queryset
+        category = self.fields['category']
+        choices = category_choices()
+        if choices is None:
+            category.widget = CategoryTypeaheadInput()
+        else:
+            category.choices = [('', category.empty_label), *choices]
         add_bootstrap_classes(self)
 
 
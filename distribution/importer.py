@@ -1,10 +1,22 @@
 # distribution/importer.py
 from decimal import Decimal, InvalidOperation
 from django.utils.dateparse import parse_date
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
 import pandas as pd
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import django
+import itertools
 import math
-from .models import Book, Category
+import multiprocessing
+import warnings
+from .choices import bump_category_choices
+from .models import Book, Category, book_dedupe_key, book_title_key
+from .rollups import RollupDeltas
 
 def normalize_id(value):
     if pd.isna(value):
@@ -51,127 +63,574 @@ def parse_decimal(val):
     except (InvalidOperation, ValueError):
         return Decimal('0.00')
 
-@transaction.atomic
-def import_books_from_dataframe(df, created_by=None):
+# ---------- Column-wise normalization ----------
+# These mirror the per-cell helpers above but convert a whole pandas Series at once.
+
+def clean_str_column(series):
     """
-    Accepts a pandas DataFrame and imports rows into DB.
-    Returns a dict: {'created': int, 'updated': int, 'skipped': int, 'errors': [str,...]}
-    Expected (case-insensitive) columns:
-      id, title, subtitle, authors, publisher, published_date, category, distribution_expense
+    Strips string values; missing and blank cells become None.
     """
-    # normalize column names
-    df.columns = [str(c).strip() for c in df.columns]
-    found_cols = [c.lower() for c in df.columns]
+    out = pd.Series(None, index=series.index, dtype=object)
+    present = series.notna()
+    stripped = series[present].astype(str).str.strip()
+    stripped = stripped[stripped != '']
+    out[stripped.index] = stripped
+    return out
 
-    # required minimal columns
-    missing = [c for c in ['title', 'authors', 'category', 'distribution_expense'] if c not in found_cols]
-    if missing:
-        raise ValueError(f'Missing required columns: {missing}')
 
-    created = updated = skipped = 0
-    errors = []
+def normalize_id_column(series):
+    """
+    Column version of normalize_id: numbers lose a trailing '.0', strings are stripped.
+    """
+    out = pd.Series(None, index=series.index, dtype=object)
+    present = series.notna()
+    if pd.api.types.is_integer_dtype(series):
+        out[present] = series[present].astype(str)
+        return out
+    if pd.api.types.is_numeric_dtype(series):
+        numeric = series[present]
+    else:
+        values = series[present]
+        kinds = values.map(type)
+        is_str = kinds == str
+        strings = values[is_str].str.strip()
+        strings = strings[strings != '']
+        out[strings.index] = strings
+        # Python ints are exact at any size; only floats go through the float path
+        is_int = kinds == int
+        out[values[is_int].index] = values[is_int].astype(str)
+        others = values[~is_str & ~is_int]
+        numeric = pd.to_numeric(others, errors='coerce')
+        unparsed = others[numeric.isna()]
+        out[unparsed.index] = unparsed.astype(str)
+        numeric = numeric.dropna()
+    numeric = numeric.astype(float)
+    whole = (numeric % 1 == 0)
+    ints = numeric[whole]
+    # the vectorized cast only holds inside int64; larger ids are converted one by one
+    fits = ints.abs() < 2 ** 63
+    out[ints[fits].index] = ints[fits].astype('int64').astype(str)
+    out[ints[~fits].index] = ints[~fits].map(lambda v: str(int(v)))
+    out[numeric[~whole].index] = numeric[~whole].map(lambda v: format(v, 'g'))
+    return out
 
-    for idx, row in df.iterrows():
-        # helper to get column by case-insensitive name
-        def g(colname):
-            for c in df.columns:
-                if c.lower() == colname:
-                    return row[c]
-            return None
-
-        raw_id = g('id')
-        raw_title = g('title')
-        raw_subtitle = g('subtitle')
-        raw_authors = g('authors')
-        raw_publisher = g('publisher')
-        raw_published_date = g('published_date')
-        raw_category = g('category')
-        raw_distribution_expense = g('distribution_expense')
-
-        # skip empty title rows
-        if pd.isna(raw_title) or str(raw_title).strip() == '':
-            skipped += 1
-            continue
 
+def parse_published_date_column(series):
+    """
+    Column version of parse_published_date. The column is parsed with a single
+    to_datetime call; only cells that do not match the inferred format are re-parsed.
+    """
+    out = pd.Series(None, index=series.index, dtype=object)
+    present = series[series.notna()]
+    if present.empty:
+        return out
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning)
+        parsed = pd.to_datetime(present, errors='coerce', dayfirst=False)
+        failed = parsed.isna()
+        if failed.any():
+            parsed[failed] = pd.to_datetime(present[failed], errors='coerce', dayfirst=False, format='mixed')
+    ok = parsed.notna()
+    out[parsed[ok].index] = parsed[ok].dt.date
+    # fall back to Django's ISO parser for what pandas rejects (e.g. out-of-range years)
+    for idx, val in present[~ok].items():
         try:
-            source_id = normalize_id(raw_id)
-            title = str(raw_title).strip()
-            subtitle = None if pd.isna(raw_subtitle) else str(raw_subtitle).strip()
-            authors = None if pd.isna(raw_authors) else str(raw_authors).strip()
-            publisher = None if pd.isna(raw_publisher) else str(raw_publisher).strip()
-            publishing_date = parse_published_date(raw_published_date)
-            category_name = 'Uncategorized' if pd.isna(raw_category) or str(raw_category).strip() == '' else str(raw_category).strip()
-            expense = parse_decimal(raw_distribution_expense)
-
-            category_obj, _ = Category.objects.get_or_create(name=category_name)
-
-            # dedupe by title + author (case-insensitive)
-            qs = Book.objects.filter(title__iexact=title)
-            if authors:
-                qs = qs.filter(author__iexact=authors)
-
-            book_data = {
-                'author': authors or '',
-                'publishing_date': publishing_date,
-                'category': category_obj,
-                'distribution_expenses': expense,   # model field name
-            }
-            # set optional fields if model has them
-            # these will be ignored if your Book model doesn't define them
-            book_data_extra = {}
-            if hasattr(Book, 'source_id'):
-                book_data_extra['source_id'] = source_id
-            if hasattr(Book, 'subtitle'):
-                book_data_extra['subtitle'] = subtitle
-            if hasattr(Book, 'publisher'):
-                book_data_extra['publisher'] = publisher
-
-            # Merge
-            book_data.update(book_data_extra)
-
-            if qs.exists():
-                book = qs.first()
-                # update fields
-                for k, v in book_data.items():
+            out[idx] = parse_date(str(val))
+        except Exception:
+            pass
+    return out
+
+
+def parse_decimal_column(series):
+    """
+    Column version of parse_decimal: commas are removed and anything that is not a
+    number becomes Decimal('0.00').
+    """
+    out = pd.Series(Decimal('0.00'), index=series.index, dtype=object)
+    text = series[series.notna()].astype(str).str.strip().str.replace(',', '', regex=False)
+    text = text[pd.to_numeric(text, errors='coerce').notna()]
+    out[text.index] = text.map(Decimal)
+    return out
+
+
+# ---------- Header mapping ----------
+
+# canonical import columns and the headers accepted for them (compared case-insensitively,
+# with '_' / '-' treated as spaces). Extend with settings.BOOK_IMPORT_COLUMN_ALIASES.
+IMPORT_COLUMN_ALIASES = {
+    'id': ['id', 'source id', 'isbn'],
+    'title': ['title', 'book title'],
+    'subtitle': ['subtitle'],
+    'authors': ['authors', 'author', 'author(s)'],
+    'publisher': ['publisher'],
+    'published_date': ['published date', 'publishing date', 'publication date'],
+    'category': ['category', 'categories'],
+    'distribution_expense': ['distribution expense', 'distribution expenses', 'expense', 'expense usd'],
+}
+
+REQUIRED_IMPORT_COLUMNS = ['title', 'authors', 'category', 'distribution_expense']
+
+
+def header_key(header):
+    return ' '.join(str(header).replace('_', ' ').replace('-', ' ').casefold().split())
+
+
+def resolve_columns(headers, aliases=None):
+    """
+    Maps sheet headers to canonical import columns once per file.
+    Returns {canonical: position}; the first header matching a column wins.
+    """
+    lookup = {}
+    configured = [IMPORT_COLUMN_ALIASES, getattr(settings, 'BOOK_IMPORT_COLUMN_ALIASES', None) or {}, aliases or {}]
+    for source in configured:
+        for canonical, names in source.items():
+            for name in [canonical, *names]:
+                lookup.setdefault(header_key(name), canonical)
+
+    mapping = {}
+    for pos, header in enumerate(headers):
+        canonical = lookup.get(header_key(header))
+        if canonical is not None and canonical not in mapping:
+            mapping[canonical] = pos
+    return mapping
+
+
+def normalize_dataframe(df, mapping=None):
+    """
+    Converts a raw import sheet into a clean frame with one column per writer field:
+    title, source_id, subtitle, author, publisher, publishing_date, category_name,
+    distribution_expenses. Rows without a title keep title=None.
+    `mapping` is the result of resolve_columns (computed here when omitted).
+    """
+    if mapping is None:
+        mapping = resolve_columns(df.columns)
+
+    def col(name):
+        if name in mapping:
+            return df.iloc[:, mapping[name]]
+        return pd.Series(None, index=df.index, dtype=object)
+
+    clean = pd.DataFrame({
+        'title': clean_str_column(col('title')),
+        'source_id': normalize_id_column(col('id')),
+        'subtitle': clean_str_column(col('subtitle')),
+        'author': clean_str_column(col('authors')).fillna(''),
+        'publisher': clean_str_column(col('publisher')),
+        'publishing_date': parse_published_date_column(col('published_date')),
+        'category_name': clean_str_column(col('category')).fillna('Uncategorized'),
+        'distribution_expenses': parse_decimal_column(col('distribution_expense')),
+    }, index=df.index, dtype=object)
+    # pandas turns None back into NaN when building the frame; the writer expects None
+    return clean.where(clean.notna(), None)
+
+
+# number of rows buffered before a flush; each flush costs one lookup query plus bulk writes
+DEFAULT_BATCH_SIZE = 500
+
+# Book fields written by the importer besides title
+BOOK_IMPORT_FIELDS = [
+    'source_id',
+    'subtitle',
+    'author',
+    'publisher',
+    'publishing_date',
+    'category',
+    'distribution_expenses',
+]
+
+
+def validate_book_values(values):
+    """
+    Runs the Book field validators (max_length, max_digits, ...) over a dict of
+    field values so a bad row is reported instead of failing a whole bulk write.
+    """
+    for name, value in values.items():
+        if name == 'category':
+            continue
+        field = Book._meta.get_field(name)
+        try:
+            field.run_validators(value)
+        except ValidationError as e:
+            raise ValueError(f"{name}: {' '.join(e.messages)}")
+
+
+def validate_category_name(name):
+    """
+    Checks a category name against Category.name before the writer creates it.
+    """
+    try:
+        Category._meta.get_field('name').clean(name, None)
+    except ValidationError as e:
+        raise ValueError(f"category: {' '.join(e.messages)}")
+
+
+class BookImportWriter:
+    """
+    Buffers parsed rows and writes them in batches.
+
+    Categories are resolved once per batch for the whole set of names, existing books
+    are loaded with a single query matching the batch's (title, author) keys and the
+    writes go through bulk_create/bulk_update. Rows are deduped by Book.dedupe_key
+    (casefolded title + author); rows without authors match on Book.title_key alone.
+    """
+
+    def __init__(self, created_by=None, batch_size=None, before_batch=None):
+        self.created_by = created_by
+        # called inside each batch's transaction before it writes (a job's heartbeat)
+        self.before_batch = before_batch
+        self.batch_size = batch_size or getattr(settings, 'BOOK_IMPORT_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+        self.created = 0
+        self.updated = 0
+        self.skipped = 0
+        self.errors = []
+        self._pending = []
+        self._categories = {}
+
+    def add(self, idx, data):
+        """
+        Queue a parsed row. `data` holds 'title', 'category_name' and BOOK_IMPORT_FIELDS
+        (except 'category').
+        """
+        self._pending.append((idx, data))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def skip(self, idx=None, error=None):
+        self.skipped += 1
+        if error is not None:
+            self.errors.append(f'Row {idx}: {error}')
+
+    def counts(self):
+        return {'created': self.created, 'updated': self.updated, 'skipped': self.skipped, 'errors': self.errors}
+
+    def result(self):
+        self.flush()
+        return self.counts()
+
+    def _resolve_categories(self, names):
+        missing = [n for n in names if n not in self._categories]
+        if not missing:
+            return
+        for c in Category.objects.filter(name__in=missing):
+            self._categories[c.name] = c
+        to_create = [Category(name=n) for n in missing if n not in self._categories]
+        if to_create:
+            Category.objects.bulk_create(to_create, batch_size=self.batch_size, ignore_conflicts=True)
+            bump_category_choices()
+            for c in Category.objects.filter(name__in=[c.name for c in to_create]):
+                self._categories[c.name] = c
+
+    def _load_existing(self, rows):
+        """
+        Returns ({dedupe_key: book}, {title_key: book}) for the batch. Rows with authors
+        are matched through dedupe_key, rows without authors through title_key (any book
+        with the same normalized title); both keys are indexed.
+        """
+        keys = {book_dedupe_key(data['title'], data['author']) for _, data in rows if data['author']}
+        title_keys = {book_title_key(data['title']) for _, data in rows if not data['author']}
+        qs = Book.objects.only(
+            'id', 'title', 'author', 'category', 'distribution_expenses', 'publishing_date', 'created_by', 'dedupe_key',
+            'title_key',
+        )
+        by_key = {}
+        by_title = {}
+        for book in qs.filter(Q(dedupe_key__in=keys) | Q(title_key__in=title_keys)):
+            by_key.setdefault(book.dedupe_key, book)
+            by_title.setdefault(book.title_key, book)
+        return by_key, by_title
+
+    def flush(self):
+        rows, self._pending = self._pending, []
+        if not rows:
+            return
+        # one transaction per batch, so imports running without an outer transaction
+        # never leave a half-written batch behind
+        with transaction.atomic():
+            if self.before_batch is not None:
+                self.before_batch()
+            self._write(rows)
+
+    def _write(self, rows):
+        self._resolve_categories({data['category_name'] for _, data in rows})
+        by_key, by_title = self._load_existing(rows)
+
+        to_create = []
+        to_update = {}
+        # bulk writes skip the Book signals, so the category rollups are adjusted here
+        deltas = RollupDeltas()
+        now = timezone.now()
+        for idx, data in rows:
+            key = book_dedupe_key(data['title'], data['author'])
+            title_key = book_title_key(data['title'])
+            if data['author']:
+                book = by_key.get(key)
+            else:
+                book = by_title.get(title_key)
+
+            values = {k: data[k] for k in BOOK_IMPORT_FIELDS if k != 'category'}
+            values['category'] = self._categories[data['category_name']]
+
+            if book is None:
+                # bulk_create skips Book.save(), so the keys are set here
+                book = Book(title=data['title'], created_by=self.created_by, dedupe_key=key, title_key=title_key, **values)
+                to_create.append(book)
+                self.created += 1
+            else:
+                if book.pk is not None and book.pk not in to_update:
+                    deltas.remove(book.category_id, book.distribution_expenses, book.publishing_date)
+                for k, v in values.items():
                     setattr(book, k, v)
                 # stamp created_by if missing
-                if created_by is not None and hasattr(Book, 'created_by') and not getattr(book, 'created_by', None):
-                    book.created_by = created_by
-                book.save()
-                updated += 1
-            else:
-                create_kwargs = {**book_data, 'title': title}
-                if created_by is not None and hasattr(Book, 'created_by'):
-                    create_kwargs['created_by'] = created_by
-                book = Book.objects.create(**create_kwargs)
-                created += 1
+                if self.created_by is not None and not book.created_by_id:
+                    book.created_by = self.created_by
+                book.dedupe_key = book_dedupe_key(book.title, book.author)
+                book.updated_at = now
+                if book.pk is not None:
+                    to_update[book.pk] = book
+                self.updated += 1
+            by_key.setdefault(book.dedupe_key, book)
+            by_title.setdefault(title_key, book)
+
+        if to_create:
+            Book.objects.bulk_create(to_create, batch_size=self.batch_size)
+        if to_update:
+            Book.objects.bulk_update(
+                list(to_update.values()),
+                BOOK_IMPORT_FIELDS + ['created_by', 'dedupe_key', 'updated_at'],
+                batch_size=self.batch_size,
+            )
+        for book in itertools.chain(to_create, to_update.values()):
+            deltas.add(book.category_id, book.distribution_expenses, book.publishing_date)
+        deltas.apply()
+
+
+def prepare_rows(df, mapping):
+    """
+    Normalizes and validates one chunk. Returns (rows, skipped, errors) where rows is a
+    list of (index, data) ready for BookImportWriter.add and errors a list of (index, message).
+    Touches no database, so it can run in a worker process.
+    """
+    clean = normalize_dataframe(df, mapping)
 
+    # skip empty title rows
+    has_title = clean['title'].notna()
+    skipped = int((~has_title).sum())
+    clean = clean[has_title]
+
+    rows = []
+    errors = []
+    fields = list(clean.columns)
+    for idx, *values in clean.itertuples(name=None):
+        data = dict(zip(fields, values))
+        try:
+            validate_book_values({k: v for k, v in data.items() if k != 'category_name'})
+            validate_category_name(data['category_name'])
         except Exception as e:
-            errors.append(f'Row {idx}: {e}')
-            skipped += 1
-            # continue to next row
+            errors.append((idx, str(e)))
             continue
+        rows.append((idx, data))
+    return rows, skipped, errors
+
+
+def feed_writer(writer, prepared):
+    rows, skipped, errors = prepared
+    writer.skipped += skipped
+    for idx, error in errors:
+        writer.skip(idx, error)
+    for idx, data in rows:
+        writer.add(idx, data)
+
+
+def iter_prepared_chunks(frames, mapping, workers=1):
+    """
+    Yields prepare_rows() results for each frame, in order. With workers > 1 the chunks
+    are prepared in a process pool while at most 2 * workers chunks are in flight, so
+    memory stays bounded. Writes are left to the caller's single writer, so duplicate
+    keys are still applied in file order and never race.
+    """
+    if workers <= 1:
+        for df in frames:
+            yield prepare_rows(df, mapping)
+        return
+
+    # spawned workers only need the app registry (for field validators), not the
+    # parent's database connections
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=django.setup) as pool:
+        pending = deque()
+        for df in frames:
+            pending.append(pool.submit(prepare_rows, df, mapping))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
 
-    return {'created': created, 'updated': updated, 'skipped': skipped, 'errors': errors}
 
-def import_books_from_filelike(file_like, filename=None, created_by=None):
+def import_book_frames(frames, created_by=None, batch_size=None, aliases=None, progress=None, atomic=True, workers=1,
+                       before_batch=None):
     """
-    Accepts uploaded file-like object. Tries excel first, then csv.
+    Imports an iterable of DataFrames sharing the same headers (e.g. chunks of one file).
+    Only one chunk is held in memory at a time; the header mapping is resolved from the first.
+    Returns a dict: {'created': int, 'updated': int, 'skipped': int, 'errors': [str,...],
+    'columns': {header: canonical column}}
+
+    `progress`, if given, is called with the running counts after every chunk.
+    With atomic=False each batch is committed on its own instead of the whole import
+    running in one transaction (used by background jobs so progress is visible).
+    `workers` > 1 parses and validates chunks in that many processes. `before_batch` is
+    called before every batch write, inside its transaction; an exception aborts the import.
+    """
+    if atomic:
+        with transaction.atomic():
+            return _import_book_frames(frames, created_by, batch_size, aliases, progress, workers, before_batch)
+    return _import_book_frames(frames, created_by, batch_size, aliases, progress, workers, before_batch)
+
+
+def _import_book_frames(frames, created_by, batch_size, aliases, progress, workers, before_batch=None):
+    frames = iter(frames)
+    first = next(frames, None)
+    if first is None:
+        raise ValueError('The file has no header row.')
+
+    mapping = resolve_columns(first.columns, aliases=aliases)
+    # required minimal columns
+    missing = [c for c in REQUIRED_IMPORT_COLUMNS if c not in mapping]
+    if missing:
+        raise ValueError(f'Missing required columns: {missing}')
+    columns = {str(first.columns[pos]): canonical for canonical, pos in mapping.items()}
+
+    writer = BookImportWriter(created_by=created_by, batch_size=batch_size, before_batch=before_batch)
+    for prepared in iter_prepared_chunks(itertools.chain([first], frames), mapping, workers=workers):
+        feed_writer(writer, prepared)
+        if progress is not None:
+            writer.flush()
+            progress({**writer.counts(), 'columns': columns})
+
+    result = writer.result()
+    result['columns'] = columns
+    return result
+
+
+def import_books_from_dataframe(df, created_by=None, batch_size=None, aliases=None):
     """
+    Accepts a pandas DataFrame and imports rows into DB.
+    Returns a dict: {'created': int, 'updated': int, 'skipped': int, 'errors': [str,...],
+    'columns': {header: canonical column}}
+    Expected (case-insensitive) columns:
+      id, title, subtitle, authors, publisher, published_date, category, distribution_expense
+    Header aliases come from IMPORT_COLUMN_ALIASES, settings.BOOK_IMPORT_COLUMN_ALIASES and `aliases`.
+    Rows are written in batches of `batch_size` (default settings.BOOK_IMPORT_BATCH_SIZE).
+    """
+    return import_book_frames([df], created_by=created_by, batch_size=batch_size, aliases=aliases)
+
+
+# ---------- File readers ----------
+
+# rows parsed per chunk when streaming a file
+DEFAULT_CHUNK_SIZE = 5000
+
+XLSX_MAGIC = b'PK\x03\x04'
+XLS_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+
+
+def detect_format(file_like):
+    """
+    Returns 'xlsx', 'xls' or 'csv' based on the leading bytes of the file.
+    """
+    file_like.seek(0)
+    head = file_like.read(len(XLS_MAGIC))
+    file_like.seek(0)
+    if isinstance(head, bytes):
+        if head.startswith(XLSX_MAGIC):
+            return 'xlsx'
+        if head.startswith(XLS_MAGIC):
+            return 'xls'
+    return 'csv'
+
+
+def iter_csv_chunks(file_like, chunk_size):
+    with pd.read_csv(file_like, dtype=object, chunksize=chunk_size) as reader:
+        yield from reader
+
+
+def iter_xlsx_chunks(file_like, chunk_size):
+    """
+    Reads the first worksheet with openpyxl's read-only row iterator, so only one chunk
+    of rows is materialized at a time. Fully empty rows are dropped like read_csv does.
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(file_like, read_only=True, data_only=True)
     try:
-        # determine by filename if possible
-        if filename and filename.lower().endswith(('.xls', '.xlsx')):
-            file_like.seek(0)
-            df = pd.read_excel(file_like, dtype=object)
-        else:
-            # try excel first; if fails, try csv
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        headers = next(rows, None)
+        if headers is None:
+            return
+        headers = ['' if h is None else h for h in headers]
+        width = len(headers)
+        start = 0
+        batch = []
+        for row in rows:
+            if all(v is None for v in row):
+                continue
+            row = tuple(row[:width]) + (None,) * (width - len(row))
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                yield pd.DataFrame(batch, columns=headers, index=range(start, start + len(batch)), dtype=object)
+                start += len(batch)
+                batch = []
+        if batch or start == 0:
+            yield pd.DataFrame(batch, columns=headers, index=range(start, start + len(batch)), dtype=object)
+    finally:
+        wb.close()
+
+
+def iter_xls_chunks(file_like, chunk_size):
+    # legacy .xls has no streaming reader; load it once and hand it out in chunks
+    df = pd.read_excel(file_like, dtype=object)
+    for start in range(0, max(len(df), 1), chunk_size):
+        yield df.iloc[start:start + chunk_size]
+
+
+CHUNK_READERS = {
+    'csv': iter_csv_chunks,
+    'xlsx': iter_xlsx_chunks,
+    'xls': iter_xls_chunks,
+}
+
+
+def iter_file_chunks(file_like, chunk_size=None):
+    """
+    Yields DataFrame chunks (dtype=object) of an uploaded CSV/XLSX/XLS file.
+    Read errors are raised as ValueError.
+    """
+    chunk_size = chunk_size or getattr(settings, 'BOOK_IMPORT_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+    try:
+        reader = CHUNK_READERS[detect_format(file_like)](file_like, chunk_size)
+        while True:
             try:
-                file_like.seek(0)
-                df = pd.read_excel(file_like, dtype=object)
-            except Exception:
-                file_like.seek(0)
-                df = pd.read_csv(file_like, dtype=object)
+                chunk = next(reader)
+            except StopIteration:
+                return
+            yield chunk
     except Exception as e:
         raise ValueError(f'Could not read uploaded file: {e}')
 
-    return import_books_from_dataframe(df, created_by=created_by)
\ No newline at end of file
+
+def import_books_from_filelike(file_like, filename=None, created_by=None, batch_size=None, aliases=None, chunk_size=None,
+                               progress=None, atomic=True, workers=1, before_batch=None):
+    """
+    Accepts uploaded file-like object. The format is detected from its magic bytes and
+    the file is streamed in chunks of `chunk_size` rows, so memory stays flat regardless
+    of file size. `filename` is kept for callers; it is not used for detection.
+    """
+    return import_book_frames(
+        iter_file_chunks(file_like, chunk_size=chunk_size),
+        created_by=created_by,
+        batch_size=batch_size,
+        aliases=aliases,
+        progress=progress,
+        atomic=atomic,
+        workers=workers,
+        before_batch=before_batch,
+    )
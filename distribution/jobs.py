@@ -0,0 +1,174 @@
+# distribution/jobs.py
+"""
+Background execution of book imports.
+
+Jobs are ImportJob rows; the web process hands them to a small in-process thread pool
+once the creating transaction commits. Claiming a job is a conditional UPDATE on its
+status, so the `process_import_jobs` command can safely drain the same table (e.g. jobs
+left pending after a restart) without an external broker.
+
+A running job touches its updated_at heartbeat before every batch it writes. One that
+has been silent for IMPORT_JOB_STALE_SECONDS belongs to a worker that died and can be
+claimed again; the import is idempotent, so the rerun updates the books the first
+attempt wrote. Every claim bumps the job's attempt counter and all of a worker's writes
+are conditional on its own attempt, so a worker that was only slow, not dead, finds out
+at its next batch and stops instead of writing alongside the new one. The uploaded file
+is deleted once a job finishes or fails.
+"""
+import datetime
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .importer import import_books_from_filelike
+from .models import ImportJob
+
+logger = logging.getLogger(__name__)
+
+# per-row errors kept on the job record; the count is always exact
+MAX_STORED_ERRORS = 500
+DEFAULT_IMPORT_JOB_STALE_SECONDS = 900
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'BOOK_IMPORT_WORKERS', 1),
+                thread_name_prefix='book-import',
+            )
+        return _executor
+
+
+def enqueue_import_job(job):
+    """
+    Schedules the job to run after the current transaction commits.
+    With settings.BOOK_IMPORT_RUN_INLINE the job runs in the calling thread instead.
+    """
+    if getattr(settings, 'BOOK_IMPORT_RUN_INLINE', False):
+        transaction.on_commit(lambda: run_import_job(job.pk))
+    else:
+        transaction.on_commit(lambda: get_executor().submit(_run_in_thread, job.pk))
+
+
+def _run_in_thread(job_id):
+    try:
+        run_import_job(job_id)
+    finally:
+        # worker threads get their own connections; don't leak them
+        connections.close_all()
+
+
+def stale_before():
+    return timezone.now() - datetime.timedelta(
+        seconds=getattr(settings, 'IMPORT_JOB_STALE_SECONDS', DEFAULT_IMPORT_JOB_STALE_SECONDS)
+    )
+
+
+def claimable_jobs():
+    """
+    Pending jobs, and running jobs whose worker stopped reporting progress.
+    """
+    return ImportJob.objects.filter(
+        Q(status=ImportJob.STATUS_PENDING) | Q(status=ImportJob.STATUS_RUNNING, updated_at__lt=stale_before())
+    )
+
+
+class ImportSuperseded(Exception):
+    """
+    The job was claimed again by another worker while this one was running it.
+    """
+
+
+def _discard_upload(job):
+    if not job.file:
+        return
+    try:
+        job.file.delete(save=False)
+    except OSError:
+        logger.warning('Could not delete the upload of import job %s', job.pk, exc_info=True)
+    ImportJob.objects.filter(pk=job.pk).update(file='')
+
+
+def _progress_fields(counts):
+    errors = counts.get('errors', [])
+    return {
+        'updated_at': timezone.now(),
+        'rows_processed': counts['created'] + counts['updated'] + counts['skipped'],
+        'books_created': counts['created'],
+        'books_updated': counts['updated'],
+        'rows_skipped': counts['skipped'],
+        'error_count': len(errors),
+        'errors': errors[:MAX_STORED_ERRORS],
+        'columns': counts.get('columns', {}),
+    }
+
+
+def run_import_job(job_id):
+    """
+    Runs a pending (or stale running) job to completion. Returns False if another worker
+    already claimed it or takes it over meanwhile. Each batch commits on its own so progress is visible while the
+    job runs; a job that fails part way keeps the batches written before the failure.
+    """
+    now = timezone.now()
+    claimed = claimable_jobs().filter(pk=job_id).update(
+        status=ImportJob.STATUS_RUNNING, started_at=now, updated_at=now, attempt=F('attempt') + 1,
+    )
+    if not claimed:
+        return False
+    job = ImportJob.objects.select_related('created_by').get(pk=job_id)
+    # matches nothing once another worker has reclaimed the job
+    jobs = ImportJob.objects.filter(pk=job_id, attempt=job.attempt)
+    if job.rows_processed:
+        logger.warning('Import job %s was abandoned after %s rows; running it again', job_id, job.rows_processed)
+
+    def write(**fields):
+        if not jobs.update(**fields):
+            raise ImportSuperseded(f'Import job {job_id} was claimed by another worker')
+
+    try:
+        with job.file.open('rb') as f:
+            result = import_books_from_filelike(
+                f,
+                filename=job.filename,
+                created_by=job.created_by,
+                progress=lambda counts: write(**_progress_fields(counts)),
+                before_batch=lambda: write(updated_at=timezone.now()),
+                atomic=False,
+            )
+    except ImportSuperseded:
+        # the batch that found out was rolled back; the new attempt owns the job and its file
+        logger.warning('Import job %s (attempt %s) was superseded; stopping', job_id, job.attempt)
+        return False
+    except Exception as exc:
+        if not isinstance(exc, ValueError):
+            logger.exception('Import job %s failed', job_id)
+        if jobs.update(status=ImportJob.STATUS_FAILED, message=str(exc), finished_at=timezone.now(), updated_at=timezone.now()):
+            _discard_upload(job)
+        return True
+
+    if jobs.update(status=ImportJob.STATUS_FINISHED, finished_at=timezone.now(), **_progress_fields(result)):
+        _discard_upload(job)
+        return True
+    logger.warning('Import job %s (attempt %s) was superseded before it finished', job_id, job.attempt)
+    return False
+
+
+def requeue_if_stale(job):
+    """
+    Hands an abandoned job back to the thread pool; the progress endpoint calls this so
+    a page watching a stuck job gets it going again.
+    """
+    if job.status == ImportJob.STATUS_RUNNING and job.updated_at < stale_before():
+        enqueue_import_job(job)
+        return True
+    return False
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from distribution.synthetic import generate_catalogue
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with a synthetic catalogue (long-tail categories and authors, "
+        "log-normal expenses) for benchmarks and load tests."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=10000, help='Books to create (default 10000)')
+        parser.add_argument('--categories', type=int, default=50, help='Categories to spread them over (default 50)')
+        parser.add_argument('--admins', type=int, default=5, help='Admin users owning the books (default 5)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same catalogue')
+        parser.add_argument('--batch-size', type=int, default=None, help='Books per INSERT batch')
+
+    def handle(self, *args, **options):
+        if options['books'] < 0 or options['categories'] < 1:
+            raise CommandError('--books must be >= 0 and --categories >= 1.')
+        verbosity = options.get('verbosity', 1)
+
+        def progress(done):
+            if verbosity > 1:
+                self.stdout.write(f'  {done} book(s)')
+
+        with transaction.atomic():
+            created = generate_catalogue(
+                options['books'], options['categories'], admins=options['admins'], seed=options['seed'],
+                batch_size=options['batch_size'], progress=progress,
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {created} synthetic book(s) in {options['categories']} categor(y/ies)."
+        ))
@@ -3,20 +3,26 @@ from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth import get_user_model
 from distribution.importer import import_books_from_filelike
 
+IMPORT_EXTENSIONS = ('.csv', '.xlsx', '.xls')
+
 
 class Command(BaseCommand):
     help = (
-        "Import books from Excel/CSV. Expected headers (case-insensitive): "
+        "Import books from Excel/CSV, or from every Excel/CSV file in a directory. "
+        "Expected headers (case-insensitive): "
         "id, title, subtitle, authors, publisher, published_date, category, distribution_expense"
     )
 
     def add_arguments(self, parser):
-        parser.add_argument('filepath', type=str, help='Path to Excel (.xlsx/.xls) or CSV file')
+        parser.add_argument('filepath', type=str, help='Path to Excel (.xlsx/.xls) or CSV file, or a directory of them')
         parser.add_argument('--username', type=str, help='Stamp created_by with this username (optional)')
+        parser.add_argument('--workers', type=int, default=1, help='Parse and validate rows in N processes (default 1)')
+        parser.add_argument('--batch-size', type=int, help='Rows per bulk write (default settings.BOOK_IMPORT_BATCH_SIZE)')
 
     def handle(self, *args, **options):
         path = options['filepath']
         username = options.get('username')
+        workers = max(options.get('workers') or 1, 1)
 
         if not os.path.exists(path):
             raise CommandError(f'File not found: {path}')
@@ -28,9 +34,41 @@ class Command(BaseCommand):
             if not created_by:
                 raise CommandError(f"No user found with username '{username}'.")
 
+        if os.path.isdir(path):
+            paths = sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if name.lower().endswith(IMPORT_EXTENSIONS) and os.path.isfile(os.path.join(path, name))
+            )
+            if not paths:
+                raise CommandError(f'No Excel/CSV files found in: {path}')
+        else:
+            paths = [path]
+
+        failed = []
+        for file_path in paths:
+            if len(paths) > 1:
+                self.stdout.write(f'{os.path.basename(file_path)}:')
+            try:
+                self.import_file(file_path, created_by, workers, options)
+            except CommandError as e:
+                if len(paths) == 1:
+                    raise
+                failed.append(file_path)
+                self.stderr.write(self.style.ERROR(str(e)))
+
+        if failed:
+            raise CommandError(f'{len(failed)} of {len(paths)} file(s) failed to import.')
+
+    def import_file(self, path, created_by, workers, options):
         try:
             with open(path, 'rb') as f:
-                result = import_books_from_filelike(f, filename=os.path.basename(path), created_by=created_by)
+                result = import_books_from_filelike(
+                    f,
+                    filename=os.path.basename(path),
+                    created_by=created_by,
+                    batch_size=options.get('batch_size'),
+                    workers=workers,
+                )
         except ValueError as e:
             raise CommandError(f'Upload failed: {e}')
         except Exception as exc:
@@ -44,4 +82,9 @@ class Command(BaseCommand):
         msg = f'Import finished — Created: {created}, Updated: {updated}, Skipped: {skipped}'
         self.stdout.write(self.style.SUCCESS(msg))
         if errors:
-            self.stdout.write(self.style.WARNING(f'Errors: {len(errors)} row(s) had issues'))
\ No newline at end of file
+            self.stdout.write(self.style.WARNING(f'Errors: {len(errors)} row(s) had issues'))
+        if options.get('verbosity', 1) > 1:
+            for header, column in result.get('columns', {}).items():
+                self.stdout.write(f'  column {header!r} -> {column}')
+            for error in errors:
+                self.stdout.write(f'  {error}')
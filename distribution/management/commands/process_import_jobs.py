@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from distribution.jobs import claimable_jobs, run_import_job
+
+
+class Command(BaseCommand):
+    help = "Run pending book import jobs (e.g. jobs left queued after a restart) and reclaim running ones whose worker died."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=0, help='Stop after this many jobs (default: all waiting)')
+
+    def handle(self, *args, **options):
+        limit = options.get('limit') or 0
+        ran = 0
+        while not limit or ran < limit:
+            job = claimable_jobs().order_by('created_at').first()
+            if job is None:
+                break
+            if run_import_job(job.pk):
+                ran += 1
+                job.refresh_from_db()
+                self.stdout.write(f'Job {job.pk} ({job.filename}): {job.status}')
+        self.stdout.write(self.style.SUCCESS(f'Processed {ran} import job(s).'))
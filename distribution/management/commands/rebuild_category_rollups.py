@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from distribution.models import Category
+from distribution.rollups import rebuild_category_rollups, rebuild_monthly_expenses
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the per-category book count / expense rollups and the monthly expense "
+        "buckets from the book table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--category', action='append', default=[], help='Only this category name (repeatable)')
+
+    def handle(self, *args, **options):
+        category_ids = None
+        if options['category']:
+            category_ids = list(Category.objects.filter(name__in=options['category']).values_list('pk', flat=True))
+        with transaction.atomic():
+            changed = rebuild_category_rollups(category_ids)
+            buckets = rebuild_monthly_expenses(category_ids)
+        if changed and options.get('verbosity', 1) > 1:
+            for name in Category.objects.filter(pk__in=changed).values_list('name', flat=True):
+                self.stdout.write(f'  corrected {name}')
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt category rollups; {len(changed)} were out of date.'))
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt monthly expenses; {buckets} bucket(s) were out of date.'))
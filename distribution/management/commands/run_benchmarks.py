@@ -0,0 +1,74 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+from django.test.utils import setup_test_environment, teardown_test_environment
+from distribution.benchmarks import compare_results, run_suite, suite_metadata
+from distribution.synthetic import generate_catalogue
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the importer, list views, expense reports and bulk deletes on a synthetic "
+        "catalogue in a throwaway test database, and write the results as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=100000, help='Synthetic books to generate (default 100000)')
+        parser.add_argument('--categories', type=int, default=200, help='Synthetic categories (default 200)')
+        parser.add_argument('--admins', type=int, default=10, help='Synthetic admin users (default 10)')
+        parser.add_argument('--import-sizes', default='10000,100000', help='Comma-separated importer row counts')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per read benchmark (default 5)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--in-place', action='store_true', help='Use the configured database as is instead of a generated test database (writes are rolled back)')
+        parser.add_argument('--output', default='benchmark-results.json', help='Where to write the results')
+        parser.add_argument('--compare', default=None, help='Earlier results file to compare against')
+        parser.add_argument('--threshold', type=float, default=0.2, help='Relative median slowdown reported as a regression (default 0.2)')
+        parser.add_argument('--fail-on-regression', action='store_true', help='Exit with an error if anything regressed')
+
+    def handle(self, *args, **options):
+        try:
+            import_sizes = [int(size) for size in options['import_sizes'].split(',') if size.strip()]
+        except ValueError:
+            raise CommandError('--import-sizes must be comma-separated integers.')
+        previous = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as fh:
+                previous = json.load(fh)
+
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        old_config = None if options['in_place'] else runner.setup_databases()
+        try:
+            if not options['in_place']:
+                self.stdout.write(f"Generating {options['books']} books in {options['categories']} categories...")
+                generate_catalogue(options['books'], options['categories'], admins=options['admins'], seed=options['seed'])
+                get_user_model().objects.create_superuser('benchmark', 'benchmark@example.com', None)
+            # never create an account in a real database
+            user = get_user_model().objects.filter(is_superuser=True).order_by('pk').first()
+            if user is None:
+                raise CommandError('--in-place needs an existing superuser to run the benchmarks as.')
+            metadata = suite_metadata()
+            results = run_suite(user, import_sizes=import_sizes, repeat=options['repeat'], progress=self.report)
+        finally:
+            if old_config is not None:
+                runner.teardown_databases(old_config)
+            teardown_test_environment()
+
+        data = {'meta': metadata, 'results': results}
+        with open(options['output'], 'w', encoding='utf-8') as fh:
+            json.dump(data, fh, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(results)} result(s) to {options['output']}."))
+
+        if previous is not None:
+            rows = compare_results(previous, data, threshold=options['threshold'])
+            regressed = [row for row in rows if row[4]]
+            for name, before, after, change, slower in rows:
+                line = f'{name:<45} {before:>10.1f} -> {after:>10.1f} ms  {change:+.0%}'
+                self.stdout.write(self.style.ERROR(line) if slower else line)
+            if regressed and options['fail_on_regression']:
+                raise CommandError(f'{len(regressed)} benchmark(s) regressed by more than {options["threshold"]:.0%}.')
+
+    def report(self, entry):
+        self.stdout.write(f"  {entry['name']:<45} {entry['median_ms']:>10.1f} ms  {entry['queries']:>4} queries")
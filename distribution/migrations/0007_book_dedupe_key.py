@@ -0,0 +1,43 @@
+import hashlib
+
+from django.db import migrations, models
+
+BACKFILL_BATCH_SIZE = 2000
+
+
+def dedupe_key(title, author):
+    # frozen copy of distribution.models.book_dedupe_key
+    def norm(value):
+        return ' '.join(str(value or '').casefold().split())
+    return hashlib.sha1(f'{norm(title)}\x1f{norm(author)}'.encode('utf-8')).hexdigest()
+
+
+def backfill_dedupe_keys(apps, schema_editor):
+    Book = apps.get_model('distribution', 'Book')
+    last_pk = 0
+    while True:
+        batch = list(
+            Book.objects.filter(pk__gt=last_pk).order_by('pk').only('id', 'title', 'author')[:BACKFILL_BATCH_SIZE]
+        )
+        if not batch:
+            break
+        for book in batch:
+            book.dedupe_key = dedupe_key(book.title, book.author)
+        Book.objects.bulk_update(batch, ['dedupe_key'], batch_size=500)
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('distribution', '0006_importjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='dedupe_key',
+            field=models.CharField(db_index=True, default='', editable=False, help_text='book_dedupe_key(title, author); kept in sync on save and by the importer', max_length=40),
+        ),
+        migrations.RunPython(backfill_dedupe_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('distribution', '0007_book_dedupe_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='book',
+            name='category',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='books', to='distribution.category'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['category', 'publishing_date'], name='book_category_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['publishing_date', 'title'], name='book_date_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['title'], name='book_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['author'], name='book_author_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['distribution_expenses'], name='book_expense_idx'),
+        ),
+    ]
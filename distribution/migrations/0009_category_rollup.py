@@ -0,0 +1,55 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+
+
+def populate_rollups(apps, schema_editor):
+    Book = apps.get_model('distribution', 'Book')
+    Category = apps.get_model('distribution', 'Category')
+    CategoryRollup = apps.get_model('distribution', 'CategoryRollup')
+    totals = {
+        row['category_id']: row
+        for row in Book.objects.order_by().values('category_id').annotate(
+            book_count=Count('pk'),
+            total_expense=Sum('distribution_expenses'),
+            first_publishing_date=Min('publishing_date'),
+            last_publishing_date=Max('publishing_date'),
+        )
+    }
+    CategoryRollup.objects.bulk_create(
+        [
+            CategoryRollup(
+                category_id=pk,
+                book_count=totals.get(pk, {}).get('book_count', 0),
+                total_expense=totals.get(pk, {}).get('total_expense') or 0,
+                first_publishing_date=totals.get(pk, {}).get('first_publishing_date'),
+                last_publishing_date=totals.get(pk, {}).get('last_publishing_date'),
+            )
+            for pk in Category.objects.values_list('pk', flat=True)
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('distribution', '0008_book_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryRollup',
+            fields=[
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rollup', serialize=False, to='distribution.category')),
+                ('book_count', models.PositiveIntegerField(default=0)),
+                ('total_expense', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('first_publishing_date', models.DateField(blank=True, null=True)),
+                ('last_publishing_date', models.DateField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
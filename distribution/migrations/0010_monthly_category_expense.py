@@ -0,0 +1,55 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+
+def populate_monthly_expenses(apps, schema_editor):
+    Book = apps.get_model('distribution', 'Book')
+    MonthlyCategoryExpense = apps.get_model('distribution', 'MonthlyCategoryExpense')
+    rows = (
+        Book.objects.order_by()
+        .filter(publishing_date__isnull=False)
+        .annotate(month=TruncMonth('publishing_date'))
+        .values('category_id', 'month')
+        .annotate(book_count=Count('pk'), total_expense=Sum('distribution_expenses'))
+    )
+    MonthlyCategoryExpense.objects.bulk_create(
+        [
+            MonthlyCategoryExpense(
+                category_id=row['category_id'],
+                month=row['month'],
+                book_count=row['book_count'],
+                total_expense=row['total_expense'] or 0,
+            )
+            for row in rows
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('distribution', '0009_category_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyCategoryExpense',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('book_count', models.IntegerField(default=0)),
+                ('total_expense', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_expenses', to='distribution.category')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['month'], name='monthly_expense_month_idx')],
+                'constraints': [models.UniqueConstraint(fields=('category', 'month'), name='monthly_expense_bucket')],
+            },
+        ),
+        migrations.RunPython(populate_monthly_expenses, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('distribution', '0010_monthly_category_expense'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('distribution', '0011_importjob_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='attempt',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,39 @@
+import hashlib
+
+from django.db import migrations, models
+
+BACKFILL_BATCH_SIZE = 2000
+
+
+def title_key(title):
+    # frozen copy of distribution.models.book_title_key
+    return hashlib.sha1(' '.join(str(title or '').casefold().split()).encode('utf-8')).hexdigest()
+
+
+def backfill_title_keys(apps, schema_editor):
+    Book = apps.get_model('distribution', 'Book')
+    last_pk = 0
+    while True:
+        batch = list(Book.objects.filter(pk__gt=last_pk).order_by('pk').only('id', 'title')[:BACKFILL_BATCH_SIZE])
+        if not batch:
+            break
+        for book in batch:
+            book.title_key = title_key(book.title)
+        Book.objects.bulk_update(batch, ['title_key'], batch_size=500)
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('distribution', '0012_importjob_attempt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='title_key',
+            field=models.CharField(db_index=True, default='', editable=False, help_text='book_title_key(title); kept in sync on save and by the importer', max_length=40),
+        ),
+        migrations.RunPython(backfill_title_keys, migrations.RunPython.noop),
+    ]
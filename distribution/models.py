@@ -1,6 +1,31 @@
+import hashlib
+
 from django.db import models
 from django.conf import settings
 
+
+def normalize_key_part(value):
+    """
+    Casefolds and collapses whitespace, so 'The  Hobbit ' and 'the hobbit' compare equal.
+    """
+    return ' '.join(str(value or '').casefold().split())
+
+
+def book_dedupe_key(title, author):
+    """
+    Hash of the normalized title + author; books sharing it are treated as the same book.
+    """
+    raw = f'{normalize_key_part(title)}\x1f{normalize_key_part(author)}'
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def book_title_key(title):
+    """
+    Hash of the normalized title alone; rows imported without an author match on it.
+    """
+    return hashlib.sha1(normalize_key_part(title).encode('utf-8')).hexdigest()
+
+
 # Create your models here.
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -20,15 +45,134 @@ class Book(models.Model):
     author = models.CharField(max_length=200)
     publisher = models.CharField(max_length=500, null=True, blank=True)
     publishing_date = models.DateField(null=True, blank=True)
-    category = models.ForeignKey(Category, on_delete=models.PROTECT, related_name='books')
+    # indexed through book_category_date_idx
+    category = models.ForeignKey(Category, on_delete=models.PROTECT, related_name='books', db_index=False)
     distribution_expenses = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+    dedupe_key = models.CharField(max_length=40, db_index=True, editable=False, default='', help_text="book_dedupe_key(title, author); kept in sync on save and by the importer")
+    title_key = models.CharField(max_length=40, db_index=True, editable=False, default='', help_text="book_title_key(title); kept in sync on save and by the importer")
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-publishing_date', 'title']
+        # chosen from BookListView: category/date-range filters and its sort columns
+        # (category__name sorts through the join and is served by the Category side)
+        indexes = [
+            models.Index(fields=['category', 'publishing_date'], name='book_category_date_idx'),
+            models.Index(fields=['publishing_date', 'title'], name='book_date_title_idx'),
+            models.Index(fields=['title'], name='book_title_idx'),
+            models.Index(fields=['author'], name='book_author_idx'),
+            models.Index(fields=['distribution_expenses'], name='book_expense_idx'),
+        ]
         
     def __str__(self):
-        return f'{self.title} — {self.author}'
\ No newline at end of file
+        return f'{self.title} — {self.author}'
+
+    def save(self, *args, **kwargs):
+        self.dedupe_key = book_dedupe_key(self.title, self.author)
+        self.title_key = book_title_key(self.title)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and ({'title', 'author'} & set(update_fields)):
+            kwargs['update_fields'] = {*update_fields, 'dedupe_key', 'title_key'}
+        super().save(*args, **kwargs)
+
+class CategoryRollup(models.Model):
+    """
+    Materialized per-category totals read by the category list; maintained by
+    distribution.rollups and rebuilt with `manage.py rebuild_category_rollups`.
+    """
+    category = models.OneToOneField(Category, on_delete=models.CASCADE, primary_key=True, related_name='rollup')
+    book_count = models.PositiveIntegerField(default=0)
+    total_expense = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    first_publishing_date = models.DateField(null=True, blank=True)
+    last_publishing_date = models.DateField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.category_id}: {self.book_count} book(s), {self.total_expense}'
+
+class MonthlyCategoryExpense(models.Model):
+    """
+    Expense fact table: dated books' count and expense total per category per calendar
+    month (`month` is the first day). Kept current by distribution.rollups; the expense
+    report sums these buckets for the whole months of a date range.
+    """
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='monthly_expenses')
+    month = models.DateField()
+    book_count = models.IntegerField(default=0)
+    total_expense = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'month'], name='monthly_expense_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['month'], name='monthly_expense_month_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.category_id} {self.month:%Y-%m}: {self.total_expense}'
+
+class ImportJob(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_FINISHED = 'finished'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_FINISHED, 'Finished'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    file = models.FileField(upload_to='imports/%Y/%m/')
+    filename = models.CharField(max_length=255)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='import_jobs')
+
+    rows_processed = models.PositiveIntegerField(default=0)
+    books_created = models.PositiveIntegerField(default=0)
+    books_updated = models.PositiveIntegerField(default=0)
+    rows_skipped = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True, help_text="Per-row errors (truncated)")
+    columns = models.JSONField(default=dict, blank=True, help_text="How sheet headers were mapped")
+    message = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # heartbeat: set before every batch, so a job whose worker died can be reclaimed
+    updated_at = models.DateTimeField(auto_now=True)
+    # bumped on every claim; a worker only writes while its attempt is still current
+    attempt = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f'{self.filename} ({self.status})'
+
+    @property
+    def is_done(self):
+        return self.status in (self.STATUS_FINISHED, self.STATUS_FAILED)
+
+    def as_progress(self):
+        return {
+            'id': self.pk,
+            'filename': self.filename,
+            'status': self.status,
+            'rows_processed': self.rows_processed,
+            'created': self.books_created,
+            'updated': self.books_updated,
+            'skipped': self.rows_skipped,
+            'error_count': self.error_count,
+            'errors': self.errors,
+            'columns': self.columns,
+            'message': self.message,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
@@ -0,0 +1,198 @@
+# distribution/pagination.py
+"""
+Keyset (cursor) pagination for the list views.
+
+Instead of OFFSET, each page is fetched with a WHERE clause on the current sort column
+plus pk, starting after the last row of the previous page, so deep pages cost the same
+as the first one and no COUNT(*) is required. Cursors are signed tokens holding the
+sort column, the boundary row's (value, pk) and the direction.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import F, Q
+from django.db.models.constants import LOOKUP_SEP
+
+CURSOR_SALT = 'distribution.pagination.cursor'
+
+
+class KeysetPage:
+    """
+    Quacks enough like django.core.paginator.Page for the list templates.
+    """
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def encode_cursor(sort, value, pk, backwards=False):
+    if value is not None and not isinstance(value, (int, float, str)):
+        value = str(value)
+    return signing.dumps({'s': sort, 'v': value, 'k': pk, 'b': backwards}, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(token, sort):
+    """
+    Returns the cursor payload, or None for a missing, tampered or stale (other sort) token.
+    """
+    if not token:
+        return None
+    try:
+        data = signing.loads(token, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        return None
+    if not isinstance(data, dict) or data.get('s') != sort or 'k' not in data:
+        return None
+    return data
+
+
+def resolve_sort_field(queryset, name):
+    """
+    Returns the output field for an order_by() name: a model field path such as
+    'category__name' or an annotation such as 'books_count'.
+    """
+    if name in queryset.query.annotations:
+        return queryset.query.annotations[name].output_field
+    model = queryset.model
+    parts = name.split(LOOKUP_SEP)
+    for part in parts[:-1]:
+        model = model._meta.get_field(part).related_model
+    return model._meta.get_field(parts[-1])
+
+
+def row_value(obj, name):
+    for part in name.split(LOOKUP_SEP):
+        obj = getattr(obj, part, None)
+        if obj is None:
+            return None
+    return obj
+
+
+def keyset_page(queryset, order, page_size, token=None):
+    """
+    Returns a KeysetPage of `queryset` ordered by `order` ('field' or '-field') then pk.
+    """
+    descending = order.startswith('-')
+    name = order.lstrip('-')
+    field = resolve_sort_field(queryset, name)
+    nullable = getattr(field, 'null', False) and name not in queryset.query.annotations
+    # keep the database's native NULL placement so plain indexes still serve the sort
+    nulls_small = connections[queryset.db].vendor not in ('postgresql', 'oracle')
+
+    cursor = decode_cursor(token, order)
+    backwards = bool(cursor and cursor.get('b'))
+    ascending = descending == backwards
+
+    expr = F(name)
+    if nullable:
+        nulls_first = nulls_small == ascending
+        nulls = {'nulls_first': True} if nulls_first else {'nulls_last': True}
+        expr = expr.asc(**nulls) if ascending else expr.desc(**nulls)
+    else:
+        expr = expr.asc() if ascending else expr.desc()
+    qs = queryset.order_by(expr, 'pk' if ascending else '-pk')
+
+    # the rows after the cursor as consecutive segments of the ordering; each segment
+    # is a plain index range (col >= v AND (col > v OR pk > k)) rather than one OR'ed
+    # predicate, which databases can't serve from an index
+    segments = [Q()]
+    if cursor is not None:
+        value = cursor['v']
+        if value is not None:
+            value = field.to_python(value)
+        beyond = 'gt' if ascending else 'lt'
+        pk_after = Q(**{f'pk__{beyond}': cursor['k']})
+        nulls_at_start = nulls_small == ascending
+        if value is None:
+            segments = [Q(**{f'{name}__isnull': True}) & pk_after]
+            if nulls_at_start:
+                segments.append(Q(**{f'{name}__isnull': False}))
+        else:
+            segments = [Q(**{f'{name}__{beyond}e': value}) & (Q(**{f'{name}__{beyond}': value}) | pk_after)]
+            if nullable and not nulls_at_start:
+                segments.append(Q(**{f'{name}__isnull': True}))
+
+    rows = []
+    for segment in segments:
+        rows += list(qs.filter(segment)[:page_size + 1 - len(rows)])
+        if len(rows) > page_size:
+            break
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+
+    has_next = has_more if not backwards else True
+    has_previous = cursor is not None if not backwards else has_more
+    next_cursor = previous_cursor = None
+    if rows and has_next:
+        next_cursor = encode_cursor(order, row_value(rows[-1], name), rows[-1].pk)
+    if rows and has_previous:
+        previous_cursor = encode_cursor(order, row_value(rows[0], name), rows[0].pk, backwards=True)
+    return KeysetPage(rows, next_cursor=next_cursor, previous_cursor=previous_cursor)
+
+
+def cached_count(queryset):
+    """
+    COUNT(*) of the queryset cached for settings.LIST_COUNT_CACHE_SECONDS (default 60),
+    or None when that setting is 0 and totals are not shown.
+    """
+    timeout = getattr(settings, 'LIST_COUNT_CACHE_SECONDS', 60)
+    if not timeout:
+        return None
+    sql, params = queryset.query.sql_with_params()
+    key = 'listcount:' + hashlib.md5(f'{queryset.db}:{sql}:{params}'.encode('utf-8')).hexdigest()
+    return cache.get_or_set(key, queryset.count, timeout)
+
+
+class KeysetPaginationMixin:
+    """
+    ListView mixin adding the cursor mode, used when settings.LIST_PAGINATION is
+    'cursor' or the request carries a ?cursor= token. Orderings the keyset can't follow
+    (e.g. search relevance) keep Django's offset paginator.
+    """
+
+    def use_cursor_pagination(self):
+        return getattr(settings, 'LIST_PAGINATION', 'offset') == 'cursor' or 'cursor' in self.request.GET
+
+    def paginate_queryset(self, queryset, page_size):
+        self.cursor_mode = False
+        order = queryset.query.order_by
+        if (
+            not self.use_cursor_pagination()
+            or len(order) != 1
+            or not isinstance(order[0], str)
+            or order[0].lstrip('-') in queryset.query.extra_select
+        ):
+            return super().paginate_queryset(queryset, page_size)
+        self.cursor_mode = True
+        self.total_count = cached_count(queryset)
+        page = keyset_page(queryset, order[0], page_size, self.request.GET.get('cursor'))
+        return (None, page, page.object_list, page.has_other_pages())
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx['cursor_mode'] = getattr(self, 'cursor_mode', False)
+        if ctx['cursor_mode']:
+            ctx['total_count'] = self.total_count
+        return ctx
@@ -0,0 +1,329 @@
+# distribution/reports.py
+"""
+Expense totals for the reports.
+
+A date range is split into the whole calendar months it covers, summed from the
+MonthlyCategoryExpense buckets, plus the partial months at either edge, aggregated
+from the book rows (a range seek on book_date_title_idx each). Without a range the
+totals come straight from CategoryRollup.
+
+Report responses are cached under a version stamp that every book/category write bumps
+(see bump_report_version), so a cached entry never outlives the data it was built from.
+"""
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, Count, F, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncMonth, TruncQuarter, TruncYear
+
+from rumipress.db_router import reading_from_replica
+from rumipress.versioning import bump_cache_version, cache_version
+
+from .models import Book, Category, CategoryRollup, MonthlyCategoryExpense
+
+
+def next_month(day):
+    return (day.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+
+
+def full_month_bounds(start, end):
+    """
+    Returns (first, stop): the whole months inside [start, end] are first <= month < stop.
+    Either bound is None when the range is open on that side.
+    """
+    first = None
+    if start is not None:
+        first = start if start.day == 1 else next_month(start)
+    stop = None
+    if end is not None:
+        stop = next_month(end) if (end + datetime.timedelta(days=1)).day == 1 else end.replace(day=1)
+    return first, stop
+
+
+def _add_totals(totals, rows):
+    for category_id, count, total in rows:
+        totals[category_id][0] += count or 0
+        totals[category_id][1] += total or Decimal('0')
+
+
+def _book_totals(**filters):
+    return (
+        Book.objects.order_by().filter(**filters).values('category_id')
+        .annotate(count=Count('pk'), total=Sum('distribution_expenses'))
+        .values_list('category_id', 'count', 'total')
+    )
+
+
+def expense_totals_by_category(start=None, end=None):
+    """
+    Returns [(category name, total)] for books published in [start, end] (dates, either
+    may be None), largest total first; only categories with books in the range.
+    """
+    totals = defaultdict(lambda: [0, Decimal('0')])
+    if start is None and end is None:
+        _add_totals(totals, CategoryRollup.objects.values_list('category_id', 'book_count', 'total_expense'))
+    else:
+        first, stop = full_month_bounds(start, end)
+        if first is not None and stop is not None and first >= stop:
+            # no whole month in the range
+            _add_totals(totals, _book_totals(publishing_date__gte=start, publishing_date__lte=end))
+        else:
+            buckets = MonthlyCategoryExpense.objects.order_by()
+            if first is not None:
+                buckets = buckets.filter(month__gte=first)
+            if stop is not None:
+                buckets = buckets.filter(month__lt=stop)
+            _add_totals(totals, buckets.values('category_id').annotate(
+                count=Sum('book_count'), total=Sum('total_expense'),
+            ).values_list('category_id', 'count', 'total'))
+            if start is not None and start < first:
+                _add_totals(totals, _book_totals(publishing_date__gte=start, publishing_date__lt=first))
+            if end is not None and stop <= end:
+                _add_totals(totals, _book_totals(publishing_date__gte=stop, publishing_date__lte=end))
+
+    names = dict(Category.objects.filter(pk__in=list(totals)).values_list('pk', 'name'))
+    rows = [
+        (names.get(category_id) or 'Uncategorized', total)
+        for category_id, (count, total) in totals.items()
+        if count > 0
+    ]
+    rows.sort(key=lambda row: row[1], reverse=True)
+    return rows
+
+
+# ---------- Analytics ----------
+
+# group_by dimensions; nullable ones are coalesced to '' so "missing" is its own group
+ANALYTICS_DIMENSIONS = {
+    'category': F('category__name'),
+    'publisher': Coalesce('publisher', Value('')),
+    'author': F('author'),
+    'created_by': Coalesce('created_by__username', Value('')),
+}
+ANALYTICS_PERIODS = {
+    'month': TruncMonth,
+    'quarter': TruncQuarter,
+    'year': TruncYear,
+}
+# a response never carries more groups than this; ask for top=N instead
+MAX_ANALYTICS_GROUPS = 10000
+
+CENTS = Decimal('0.01')
+
+
+def _grouped(qs, aliases, total, count):
+    return qs.values(*aliases.values()).annotate(total=total, count=count)
+
+
+def _bucket_groups(aliases, start, end, category_id, leaders=None):
+    """
+    Group rows for category/period-only requests, built from MonthlyCategoryExpense for
+    the whole months plus the book rows of the partial edge months (and the undated
+    books when the range is open on both sides). With `leaders`, other categories are
+    grouped together as None.
+    """
+    def annotate(qs, date_field, category_field):
+        exprs = {}
+        for name, alias in aliases.items():
+            if name in ANALYTICS_PERIODS:
+                exprs[alias] = ANALYTICS_PERIODS[name](date_field)
+            elif leaders is not None:
+                exprs[alias] = Case(When(**{f'{category_field}__in': leaders}, then=F(category_field)), default=Value(None))
+            else:
+                exprs[alias] = F(category_field)
+        qs = qs.order_by().annotate(**exprs)
+        if category_id is not None:
+            qs = qs.filter(category_id=category_id)
+        return qs
+
+    def books(**filters):
+        qs = annotate(Book.objects.filter(**filters), 'publishing_date', 'category__name')
+        return _grouped(qs, aliases, Sum('distribution_expenses'), Count('pk'))
+
+    parts = []
+    first, stop = full_month_bounds(start, end)
+    if first is not None and stop is not None and first >= stop:
+        parts.append(books(publishing_date__gte=start, publishing_date__lte=end))
+    else:
+        buckets = MonthlyCategoryExpense.objects.all()
+        if first is not None:
+            buckets = buckets.filter(month__gte=first)
+        if stop is not None:
+            buckets = buckets.filter(month__lt=stop)
+        parts.append(_grouped(annotate(buckets, 'month', 'category__name'), aliases, Sum('total_expense'), Sum('book_count')))
+        if start is not None and start < first:
+            parts.append(books(publishing_date__gte=start, publishing_date__lt=first))
+        if end is not None and stop <= end:
+            parts.append(books(publishing_date__gte=stop, publishing_date__lte=end))
+        if start is None and end is None:
+            parts.append(books(publishing_date__isnull=True))
+
+    merged = defaultdict(lambda: [Decimal('0'), 0])
+    for part in parts:
+        for row in part:
+            group = merged[tuple(row[alias] for alias in aliases.values())]
+            group[0] += row['total'] or Decimal('0')
+            group[1] += row['count'] or 0
+    return [
+        {**dict(zip(aliases.values(), key)), 'total': total, 'count': count}
+        for key, (total, count) in merged.items()
+        if count
+    ]
+
+
+def expense_analytics(group_by, start=None, end=None, category_id=None, top=None, use_buckets=True):
+    """
+    Expense totals and book counts grouped by `group_by`, a list of dimensions
+    (ANALYTICS_DIMENSIONS) plus at most one period (ANALYTICS_PERIODS), which makes
+    the result a time series. With `top`, only the `top` largest values of the first
+    dimension are kept and the rest are summed into rows flagged 'other'.
+
+    Category/period-only requests are answered from the monthly buckets (see
+    _bucket_groups); anything else is one grouped SQL statement over the books, with the
+    top-N as a subquery of it. Totals are Decimals. Raises ValueError for an invalid
+    request.
+    """
+    group_by = list(dict.fromkeys(group_by))
+    unknown = [g for g in group_by if g not in ANALYTICS_DIMENSIONS and g not in ANALYTICS_PERIODS]
+    if unknown:
+        raise ValueError(f"Unknown group_by: {', '.join(unknown)}")
+    if not group_by:
+        raise ValueError('group_by is required.')
+    periods = [g for g in group_by if g in ANALYTICS_PERIODS]
+    if len(periods) > 1:
+        raise ValueError('Group by at most one of month, quarter, year.')
+    dimensions = [g for g in group_by if g in ANALYTICS_DIMENSIONS]
+    lead = dimensions[0] if top and dimensions else None
+    aliases = {name: f'g_{name}' for name in group_by}
+
+    if use_buckets and set(dimensions) <= {'category'}:
+        leaders = None
+        if lead:
+            totals = _bucket_groups({'category': 'g_category'}, start, end, category_id)
+            totals.sort(key=lambda row: (-row['total'], row['g_category']))
+            leaders = [row['g_category'] for row in totals[:top]]
+        rows = _bucket_groups(aliases, start, end, category_id, leaders)
+        rows.sort(key=lambda row: row['total'], reverse=True)
+        for alias in (aliases[p] for p in periods):
+            rows.sort(key=lambda row: (row[alias] is not None, row[alias] or datetime.date.min))
+    else:
+        qs = Book.objects.order_by()
+        if start is not None:
+            qs = qs.filter(publishing_date__gte=start)
+        if end is not None:
+            qs = qs.filter(publishing_date__lte=end)
+        if category_id is not None:
+            qs = qs.filter(category_id=category_id)
+        for name in group_by:
+            if name in ANALYTICS_PERIODS:
+                qs = qs.annotate(**{aliases[name]: ANALYTICS_PERIODS[name]('publishing_date')})
+            else:
+                qs = qs.annotate(**{aliases[name]: ANALYTICS_DIMENSIONS[name]})
+        if lead:
+            ranked = aliases[lead]
+            leaders = (
+                qs.values(ranked)
+                .annotate(rank_total=Sum('distribution_expenses'))
+                .order_by('-rank_total', ranked)
+                .values(ranked)[:top]
+            )
+            aliases[lead] = f'top_{lead}'
+            qs = qs.annotate(**{aliases[lead]: Case(
+                When(**{f'{ranked}__in': Subquery(leaders)}, then=F(ranked)),
+                default=Value(None),
+            )})
+        order = [aliases[p] for p in periods] + ['-total']
+        rows = list(
+            _grouped(qs, aliases, Sum('distribution_expenses'), Count('pk'))
+            .order_by(*order)[:MAX_ANALYTICS_GROUPS + 1]
+        )
+    if len(rows) > MAX_ANALYTICS_GROUPS:
+        raise ValueError(f'More than {MAX_ANALYTICS_GROUPS} groups; narrow the range or pass top=N.')
+
+    result = []
+    grand_total = Decimal('0')
+    book_count = 0
+    for row in rows:
+        total = (row['total'] or Decimal('0')).quantize(CENTS)
+        item = {name: row[alias] for name, alias in aliases.items()}
+        if lead:
+            item['other'] = row[aliases[lead]] is None
+        item['total'] = total
+        item['count'] = row['count']
+        grand_total += total
+        book_count += row['count']
+        result.append(item)
+    return {'group_by': group_by, 'total': grand_total, 'count': book_count, 'rows': result}
+
+
+# ---------- Response cache ----------
+
+REPORT_VERSION_KEY = 'reports:version'
+REPORT_HITS_KEY = 'reports:hits'
+REPORT_MISSES_KEY = 'reports:misses'
+REPORT_NOT_MODIFIED_KEY = 'reports:not_modified'
+
+
+def report_version():
+    return cache_version(REPORT_VERSION_KEY)
+
+
+def bump_report_version(**kwargs):
+    """
+    Makes every cached report stale, now and after commit. Also usable as a signal
+    receiver.
+    """
+    bump_cache_version(REPORT_VERSION_KEY)
+
+
+def count_report_event(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, None)
+
+
+def cached_report(name, params, compute):
+    """
+    Returns compute() for the report `name` and its normalized `params`, from the cache
+    when an entry for the current version exists.
+    """
+    key = f'reports:{name}:' + ':'.join(str(p or '') for p in params)
+    version = report_version()
+    data = cache.get(key, version=version)
+    if data is not None:
+        count_report_event(REPORT_HITS_KEY)
+        return data
+    count_report_event(REPORT_MISSES_KEY)
+    data = compute()
+    timeout = getattr(settings, 'REPORT_CACHE_SECONDS', 3600)
+    if reading_from_replica():
+        # the replica may not have caught up with the write that bumped the version yet
+        timeout = min(timeout, getattr(settings, 'REPLICA_REPORT_CACHE_SECONDS', 60))
+    cache.set(key, data, timeout, version=version)
+    return data
+
+
+def report_etag(name, params):
+    return f'{name}-{report_version()}-' + '-'.join(str(p or '') for p in params)
+
+
+def report_cache_stats():
+    """
+    Counters since the cache was last cleared; 304s count as hits in the rate.
+    """
+    hits = cache.get(REPORT_HITS_KEY, 0)
+    misses = cache.get(REPORT_MISSES_KEY, 0)
+    not_modified = cache.get(REPORT_NOT_MODIFIED_KEY, 0)
+    total = hits + misses + not_modified
+    return {
+        'backend': settings.CACHES['default']['BACKEND'],
+        'version': report_version(),
+        'hits': hits,
+        'misses': misses,
+        'not_modified': not_modified,
+        'hit_rate': round((hits + not_modified) / total, 4) if total else None,
+    }
@@ -0,0 +1,322 @@
+# distribution/rollups.py
+"""
+Maintenance of the precomputed book totals:
+
+- CategoryRollup, the per-category book count, expense total and first/last publishing
+  date behind the category list;
+- MonthlyCategoryExpense, the per-category per-month expense buckets behind the
+  expense report.
+
+Counts and totals are adjusted by deltas rather than re-aggregated from the book table:
+Book save/delete signals adjust the affected rows, while the importer and bulk deletes
+collect their deltas and apply them in one UPDATE per batch of categories. First/last
+dates are re-read for every touched category, a single seek each on
+book_category_date_idx.
+Monthly buckets are upserted with one INSERT ... ON CONFLICT per batch of deltas.
+`manage.py rebuild_category_rollups` recomputes everything from the books.
+"""
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from decimal import Decimal
+
+import datetime
+
+from django.db import connections, router
+from django.db.models import (
+    Case, Count, DecimalField, F, IntegerField, Max, Min, OuterRef, Q, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Book, Category, CategoryRollup, MonthlyCategoryExpense
+from .reports import bump_report_version
+
+# fields whose change moves a book's numbers between or within rollups
+ROLLUP_BOOK_FIELDS = {'category', 'category_id', 'distribution_expenses', 'publishing_date'}
+
+# categories per rollup UPDATE / monthly buckets per INSERT ... ON CONFLICT statement
+UPSERT_BATCH_SIZE = 200
+
+_local = threading.local()
+
+
+def month_start(value):
+    if isinstance(value, str):
+        value = parse_date(value)
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    return value.replace(day=1) if value else None
+
+
+class RollupDeltas:
+    """
+    Per-category and per-(category, month) (book count, expense) changes waiting to be
+    applied.
+    """
+
+    def __init__(self):
+        self.changes = defaultdict(lambda: [0, Decimal('0')])
+        self.months = defaultdict(lambda: [0, Decimal('0')])
+
+    def __bool__(self):
+        return bool(self.changes)
+
+    def add(self, category_id, expense, publishing_date=None, sign=1):
+        if category_id is None:
+            return
+        expense = sign * Decimal(str(expense or 0))
+        change = self.changes[category_id]
+        change[0] += sign
+        change[1] += expense
+        month = month_start(publishing_date)
+        if month is not None:
+            bucket = self.months[(category_id, month)]
+            bucket[0] += sign
+            bucket[1] += expense
+
+    def remove(self, category_id, expense, publishing_date=None):
+        self.add(category_id, expense, publishing_date, sign=-1)
+
+    def apply(self):
+        if not self.changes:
+            return
+        apply_rollup_deltas(self.changes)
+        apply_monthly_deltas(self.months)
+        bump_report_version()
+        self.changes.clear()
+        self.months.clear()
+
+
+def _date_bound(order):
+    return Subquery(
+        Book.objects.filter(category_id=OuterRef('category_id'), publishing_date__isnull=False)
+        .order_by(order)
+        .values('publishing_date')[:1]
+    )
+
+
+def _per_category(changes, index, output_field):
+    return Case(
+        *[When(category_id=category_id, then=Value(change[index])) for category_id, change in changes],
+        default=Value(0),
+        output_field=output_field,
+    )
+
+
+def apply_rollup_deltas(changes):
+    """
+    Applies {category_id: (count delta, expense delta)} with one UPDATE per batch of
+    categories (a CASE per column); categories without a rollup row yet are computed
+    from scratch.
+    """
+    items = list(changes.items())
+    now = timezone.now()
+    missing = []
+    for i in range(0, len(items), UPSERT_BATCH_SIZE):
+        batch = items[i:i + UPSERT_BATCH_SIZE]
+        ids = [category_id for category_id, _ in batch]
+        updated = CategoryRollup.objects.filter(category_id__in=ids).update(
+            book_count=F('book_count') + _per_category(batch, 0, IntegerField()),
+            total_expense=F('total_expense') + _per_category(batch, 1, DecimalField(max_digits=14, decimal_places=2)),
+            first_publishing_date=_date_bound('publishing_date'),
+            last_publishing_date=_date_bound('-publishing_date'),
+            updated_at=now,
+        )
+        if updated < len(ids):
+            existing = set(CategoryRollup.objects.filter(category_id__in=ids).values_list('category_id', flat=True))
+            missing += [category_id for category_id in ids if category_id not in existing]
+    if missing:
+        rebuild_category_rollups(missing)
+
+
+def _drop_empty_buckets(using, keys):
+    # a bucket whose last book moved away or was deleted; the rebuild would not create it
+    match = Q()
+    for category_id, month in keys:
+        match |= Q(category_id=category_id, month=month)
+    MonthlyCategoryExpense.objects.using(using).filter(match, book_count=0).delete()
+
+
+def apply_monthly_deltas(months):
+    """
+    Adds {(category_id, month): (count delta, expense delta)} to the monthly buckets,
+    creating missing ones and removing the ones left without books.
+    """
+    rows = [(key, change) for key, change in months.items() if change[0] or change[1]]
+    if not rows:
+        return
+    using = router.db_for_write(MonthlyCategoryExpense)
+    connection = connections[using]
+    if connection.vendor not in ('sqlite', 'postgresql'):
+        for (category_id, month), (count, expense) in rows:
+            updated = MonthlyCategoryExpense.objects.using(using).filter(category_id=category_id, month=month).update(
+                book_count=F('book_count') + count, total_expense=F('total_expense') + expense,
+            )
+            if not updated:
+                MonthlyCategoryExpense.objects.using(using).create(
+                    category_id=category_id, month=month, book_count=count, total_expense=expense,
+                )
+        for i in range(0, len(rows), UPSERT_BATCH_SIZE):
+            _drop_empty_buckets(using, [key for key, _ in rows[i:i + UPSERT_BATCH_SIZE]])
+        return
+    qn = connection.ops.quote_name
+    table = qn(MonthlyCategoryExpense._meta.db_table)
+    for i in range(0, len(rows), UPSERT_BATCH_SIZE):
+        batch = rows[i:i + UPSERT_BATCH_SIZE]
+        params = []
+        for (category_id, month), (count, expense) in batch:
+            params += [
+                category_id,
+                connection.ops.adapt_datefield_value(month),
+                count,
+                connection.ops.adapt_decimalfield_value(expense, 14, 2),
+            ]
+        values = ', '.join(['(%s, %s, %s, %s)'] * len(batch))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (category_id, month, book_count, total_expense) VALUES {values} "
+                f"ON CONFLICT (category_id, month) DO UPDATE SET "
+                f"book_count = {table}.book_count + excluded.book_count, "
+                f"total_expense = {table}.total_expense + excluded.total_expense",
+                params,
+            )
+        if any(count < 0 for _, (count, _) in batch):
+            _drop_empty_buckets(using, [key for key, _ in batch])
+
+
+def compute_category_rollups(category_ids=None):
+    """
+    Returns unsaved CategoryRollup objects aggregated from the book table, one per
+    category (every category when `category_ids` is None).
+    """
+    categories = Category.objects.order_by('pk')
+    books = Book.objects.order_by()
+    if category_ids is not None:
+        categories = categories.filter(pk__in=category_ids)
+        books = books.filter(category_id__in=category_ids)
+    totals = {
+        row['category_id']: row
+        for row in books.values('category_id').annotate(
+            book_count=Count('pk'),
+            total_expense=Sum('distribution_expenses'),
+            first_publishing_date=Min('publishing_date'),
+            last_publishing_date=Max('publishing_date'),
+        )
+    }
+    rollups = []
+    for pk in categories.values_list('pk', flat=True):
+        row = totals.get(pk, {})
+        rollups.append(CategoryRollup(
+            category_id=pk,
+            book_count=row.get('book_count', 0),
+            total_expense=row.get('total_expense') or Decimal('0'),
+            first_publishing_date=row.get('first_publishing_date'),
+            last_publishing_date=row.get('last_publishing_date'),
+        ))
+    return rollups
+
+
+def rollup_values(rollup):
+    return (rollup.book_count, Decimal(rollup.total_expense), rollup.first_publishing_date, rollup.last_publishing_date)
+
+
+def rebuild_category_rollups(category_ids=None):
+    """
+    Recomputes rollups from the book table and upserts them. Returns the ids of the
+    categories whose stored rollup was missing or differed.
+    """
+    rollups = compute_category_rollups(category_ids)
+    stored = CategoryRollup.objects.all()
+    if category_ids is not None:
+        stored = stored.filter(category_id__in=category_ids)
+    stored = {r.category_id: rollup_values(r) for r in stored}
+    changed = [r.category_id for r in rollups if stored.get(r.category_id) != rollup_values(r)]
+    CategoryRollup.objects.bulk_create(
+        rollups,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['category'],
+        update_fields=['book_count', 'total_expense', 'first_publishing_date', 'last_publishing_date', 'updated_at'],
+    )
+    return changed
+
+
+def rebuild_monthly_expenses(category_ids=None):
+    """
+    Recomputes the monthly expense buckets from the book table and replaces them.
+    Returns the number of buckets that were missing, stale or left over.
+    """
+    books = Book.objects.order_by().filter(publishing_date__isnull=False)
+    stored = MonthlyCategoryExpense.objects.all()
+    if category_ids is not None:
+        books = books.filter(category_id__in=category_ids)
+        stored = stored.filter(category_id__in=category_ids)
+    computed = {
+        (row['category_id'], row['month']): (row['book_count'], row['total_expense'])
+        for row in books.annotate(month=TruncMonth('publishing_date')).values('category_id', 'month').annotate(
+            book_count=Count('pk'), total_expense=Sum('distribution_expenses'),
+        )
+    }
+    existing = {(f.category_id, f.month): (f.book_count, f.total_expense) for f in stored}
+    changed = sum(1 for key in computed.keys() | existing.keys() if computed.get(key) != existing.get(key))
+    stored.delete()
+    MonthlyCategoryExpense.objects.bulk_create(
+        [
+            MonthlyCategoryExpense(category_id=category_id, month=month, book_count=count, total_expense=total)
+            for (category_id, month), (count, total) in computed.items()
+        ],
+        batch_size=500,
+    )
+    return changed
+
+
+@contextmanager
+def deferred_rollups():
+    """
+    Collects the deltas of Book saves/deletes inside the block and applies them
+    together on exit, so a bulk operation costs one rollup UPDATE instead of one per
+    book. Nested blocks share the outermost collector.
+    """
+    deltas = getattr(_local, 'deltas', None)
+    if deltas is not None:
+        yield deltas
+        return
+    _local.deltas = deltas = RollupDeltas()
+    try:
+        yield deltas
+    finally:
+        _local.deltas = None
+    deltas.apply()
+
+
+# ---------- Book signal receivers (connected in DistributionConfig.ready) ----------
+
+def book_pre_save(sender, instance, update_fields=None, **kwargs):
+    instance._rollup_previous = None
+    if update_fields is not None and not ROLLUP_BOOK_FIELDS & set(update_fields):
+        instance._rollup_skip = True
+        return
+    instance._rollup_skip = False
+    if instance.pk is not None and not instance._state.adding:
+        instance._rollup_previous = (
+            Book.objects.filter(pk=instance.pk)
+            .values_list('category_id', 'distribution_expenses', 'publishing_date')
+            .first()
+        )
+
+
+def book_post_save(sender, instance, created, **kwargs):
+    if getattr(instance, '_rollup_skip', False):
+        return
+    previous = getattr(instance, '_rollup_previous', None)
+    with deferred_rollups() as deltas:
+        if previous is not None:
+            deltas.remove(*previous)
+        deltas.add(instance.category_id, instance.distribution_expenses, instance.publishing_date)
+
+
+def book_post_delete(sender, instance, **kwargs):
+    with deferred_rollups() as deltas:
+        deltas.remove(instance.category_id, instance.distribution_expenses, instance.publishing_date)
@@ -0,0 +1,196 @@
+# distribution/search.py
+"""
+Search backends for the book list search box.
+
+- SQLite: an FTS5 table over title/author/publisher, kept in sync by triggers.
+- PostgreSQL: a GIN index on a to_tsvector() expression.
+- Anything else (or BOOK_SEARCH_BACKEND = 'basic'): icontains on the three columns.
+
+Both full-text backends match every search word as a prefix and annotate a
+`search_rank` column the list view orders by when no explicit sort is chosen. They only
+add a filter and an annotation, so the result composes with any other filtering.
+The FTS table / GIN index is (re)created after every migrate, see install_search_index.
+Which backend a database alias gets is detected once per process (and again after the
+index is installed) rather than on every search.
+"""
+import re
+
+from django.conf import settings
+from django.db import connections, router, DEFAULT_DB_ALIAS
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Book
+
+# words beyond this are ignored, so a pasted paragraph can't build a huge query
+MAX_SEARCH_TERMS = 8
+
+TOKEN_RE = re.compile(r'\w+')
+
+BOOK_TABLE = Book._meta.db_table
+FTS_TABLE = 'distribution_book_fts'
+PG_INDEX = 'book_search_gin'
+PG_DOCUMENT = (
+    "to_tsvector('simple', coalesce({t}title, '') || ' ' || coalesce({t}author, '') "
+    "|| ' ' || coalesce({t}publisher, ''))"
+)
+
+
+def search_terms(q):
+    return TOKEN_RE.findall(q or '')[:MAX_SEARCH_TERMS]
+
+
+class BasicSearchBackend:
+    name = 'basic'
+    # order_by() for relevance, or None when the backend can't rank
+    rank_ordering = None
+
+    def filter(self, qs, q):
+        return qs.filter(Q(title__icontains=q) | Q(author__icontains=q) | Q(publisher__icontains=q))
+
+
+class SQLiteFTSSearchBackend(BasicSearchBackend):
+    name = 'sqlite_fts'
+    # FTS5's rank is bm25(), lower is better
+    rank_ordering = 'search_rank'
+
+    def filter(self, qs, q):
+        terms = search_terms(q)
+        if not terms:
+            return super().filter(qs, q)
+        match = ' '.join(f'"{term}"*' for term in terms)
+        # the MATCH drives the query and books are looked up by rowid; the rank is read
+        # back per matched book through the FTS table's rowid
+        matches = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+        rank = RawSQL(
+            f'SELECT rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = {BOOK_TABLE}.id',
+            [match], output_field=FloatField(),
+        )
+        return qs.filter(pk__in=matches).annotate(search_rank=rank)
+
+
+class PostgresSearchBackend(BasicSearchBackend):
+    name = 'postgres'
+    # ts_rank(), higher is better
+    rank_ordering = '-search_rank'
+
+    def filter(self, qs, q):
+        terms = search_terms(q)
+        if not terms:
+            return super().filter(qs, q)
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        # must stay the same expression as the book_search_gin index
+        document = PG_DOCUMENT.format(t=f'"{BOOK_TABLE}".')
+        matches = RawSQL(f"{document} @@ to_tsquery('simple', %s)", [tsquery], output_field=BooleanField())
+        rank = RawSQL(f"ts_rank({document}, to_tsquery('simple', %s))", [tsquery], output_field=FloatField())
+        return qs.filter(matches).annotate(search_rank=rank)
+
+
+SEARCH_BACKENDS = {
+    'basic': BasicSearchBackend,
+    'sqlite_fts': SQLiteFTSSearchBackend,
+    'postgres': PostgresSearchBackend,
+}
+
+
+# database alias -> detected backend name
+_detected = {}
+
+
+def detect_search_backend(using):
+    name = _detected.get(using)
+    if name is None:
+        connection = connections[using]
+        if connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names():
+            name = 'sqlite_fts'
+        elif connection.vendor == 'postgresql':
+            name = 'postgres'
+        else:
+            name = 'basic'
+        _detected[using] = name
+    return name
+
+
+def get_search_backend(using=None):
+    """
+    Returns the backend named by settings.BOOK_SEARCH_BACKEND, or with 'auto' (default)
+    the full-text backend for the vendor of `using` (the alias book reads are routed to
+    when not given) when its index is installed.
+    """
+    name = getattr(settings, 'BOOK_SEARCH_BACKEND', 'auto')
+    if name == 'auto':
+        name = detect_search_backend(using or router.db_for_read(Book) or DEFAULT_DB_ALIAS)
+    return SEARCH_BACKENDS[name]()
+
+
+# ---------- Index installation ----------
+
+SQLITE_TRIGGERS = {
+    f'{FTS_TABLE}_ai': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {BOOK_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, title, author, publisher)
+            VALUES (new.id, new.title, new.author, new.publisher);
+        END""",
+    f'{FTS_TABLE}_ad': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {BOOK_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author, publisher)
+            VALUES ('delete', old.id, old.title, old.author, old.publisher);
+        END""",
+    f'{FTS_TABLE}_au': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title, author, publisher ON {BOOK_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author, publisher)
+            VALUES ('delete', old.id, old.title, old.author, old.publisher);
+            INSERT INTO {FTS_TABLE}(rowid, title, author, publisher)
+            VALUES (new.id, new.title, new.author, new.publisher);
+        END""",
+}
+
+
+def install_sqlite_fts(connection):
+    """
+    Creates the FTS5 table and its sync triggers if missing. SQLite drops triggers when
+    a migration rebuilds the book table, so a missing trigger also means the index may
+    be stale and it is rebuilt from the book table.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') AND name LIKE %s",
+            [f'{FTS_TABLE}%'],
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        if FTS_TABLE in existing and existing.issuperset(SQLITE_TRIGGERS):
+            return False
+        try:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                f"title, author, publisher, content='{BOOK_TABLE}', content_rowid='id', "
+                f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+        except Exception:
+            # SQLite built without FTS5: searches fall back to the basic backend
+            return False
+        for sql in SQLITE_TRIGGERS.values():
+            cursor.execute(sql)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def install_postgres_index(connection):
+    with connection.cursor() as cursor:
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {PG_INDEX} ON {BOOK_TABLE} USING gin ({PG_DOCUMENT.format(t="")})')
+    return True
+
+
+def install_search_index(using=DEFAULT_DB_ALIAS):
+    _detected.pop(using, None)
+    if not router.allow_migrate_model(using, Book):
+        # e.g. a read replica, which gets the index through replication
+        return False
+    connection = connections[using]
+    if BOOK_TABLE not in connection.introspection.table_names():
+        return False
+    if connection.vendor == 'sqlite':
+        return install_sqlite_fts(connection)
+    if connection.vendor == 'postgresql':
+        return install_postgres_index(connection)
+    return False
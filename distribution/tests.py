@@ -1,4 +1,4 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 from .models import Category, Book
 from decimal import Decimal
 
@@ -10,5 +10,1086 @@ class BookModelTest(TestCase):
         Book.objects.create(title='A', author='X', category=c, distribution_expenses=Decimal('100'))
         Book.objects.create(title='B', author='Y', category=c, distribution_expenses=Decimal('150'))
         from django.db.models import Sum
-        total = Book.objects.filter(Category=c).aaggregate(total=Sum('distribution_expenses'))['total']
-        self.assertEqual(total, Decimal('250'))
\ No newline at end of file
+        total = Book.objects.filter(category=c).aggregate(total=Sum('distribution_expenses'))['total']
+        self.assertEqual(total, Decimal('250'))
+
+class BookImporterTest(TestCase):
+    def make_df(self, rows):
+        import pandas as pd
+        return pd.DataFrame(rows, columns=['id', 'title', 'subtitle', 'authors', 'publisher', 'published_date', 'category', 'distribution_expense'])
+
+    def test_creates_updates_and_dedupes(self):
+        from .importer import import_books_from_dataframe
+        c = Category.objects.create(name='Poetry')
+        Book.objects.create(title='Existing', author='Someone', category=c, distribution_expenses=Decimal('1'))
+        df = self.make_df([
+            [1, 'Existing', None, 'SOMEONE', 'Pub', '01/02/2020', 'Poetry', '1,250.50'],
+            [2, 'New', None, 'Author', None, None, 'Fiction', '10'],
+            [3, 'new', None, 'author', None, None, 'Fiction', '20'],
+            [4, None, None, 'Nobody', None, None, 'Fiction', '5'],
+        ])
+        result = import_books_from_dataframe(df, batch_size=2)
+        self.assertEqual((result['created'], result['updated'], result['skipped']), (1, 2, 1))
+        self.assertEqual(Book.objects.count(), 2)
+        existing = Book.objects.get(title='Existing')
+        self.assertEqual(existing.distribution_expenses, Decimal('1250.50'))
+        self.assertEqual(existing.publisher, 'Pub')
+        self.assertEqual(Book.objects.get(title='New').distribution_expenses, Decimal('20'))
+        self.assertTrue(Category.objects.filter(name='Fiction').exists())
+
+    def test_query_count_does_not_grow_with_rows(self):
+        from .importer import import_books_from_dataframe
+        df = self.make_df([[i, f'Title {i}', None, 'A', None, None, f'Cat {i % 3}', '1'] for i in range(60)])
+        # the rollup writes grow with the batch's categories, not its rows
+        with self.assertNumQueries(15):
+            import_books_from_dataframe(df, batch_size=1000)
+        self.assertEqual(Book.objects.count(), 60)
+
+    def test_invalid_row_is_reported(self):
+        from .importer import import_books_from_dataframe
+        df = self.make_df([[1, 'x' * 300, None, 'A', None, None, 'Poetry', '1']])
+        result = import_books_from_dataframe(df)
+        self.assertEqual(result['skipped'], 1)
+        self.assertEqual(len(result['errors']), 1)
+        self.assertEqual(Book.objects.count(), 0)
+
+    def test_invalid_category_name_is_reported(self):
+        from .importer import import_books_from_dataframe
+        df = self.make_df([
+            [1, 'Bad', None, 'A', None, None, 'c' * 150, '1'],
+            [2, 'Good', None, 'B', None, None, 'Poetry', '1'],
+        ])
+        result = import_books_from_dataframe(df)
+        self.assertEqual((result['created'], result['skipped']), (1, 1))
+        self.assertIn('category:', result['errors'][0])
+        self.assertEqual(list(Category.objects.values_list('name', flat=True)), ['Poetry'])
+
+    def test_normalize_id_column_keeps_large_ids(self):
+        import pandas as pd
+        from .importer import normalize_id, normalize_id_column
+        values = [1e19, -3e20, 12.0, 2.5, 10 ** 20, ' 0012 ']
+        self.assertEqual(
+            list(normalize_id_column(pd.Series(values, dtype=object))),
+            ['10000000000000000000', '-300000000000000000000', '12', '2.5', '100000000000000000000', '0012'],
+        )
+        floats = pd.Series([1e19, 12.0, 2.5])
+        self.assertEqual(list(normalize_id_column(floats)), [normalize_id(v) for v in floats])
+        self.assertEqual(list(normalize_id_column(pd.Series([7, 2 ** 62]))), ['7', str(2 ** 62)])
+
+    def test_normalize_dataframe_converts_columns(self):
+        import datetime
+        from .importer import normalize_dataframe
+        df = self.make_df([
+            [12.0, ' Title ', None, ' Ann ', None, '03/04/2021', None, ' 1,000.25 '],
+            [' 0012 ', 'Other', None, None, None, '2021-05-06', ' ', 'n/a'],
+        ])
+        rows = normalize_dataframe(df).to_dict('records')
+        self.assertEqual(rows[0]['source_id'], '12')
+        self.assertEqual(rows[0]['title'], 'Title')
+        self.assertEqual(rows[0]['author'], 'Ann')
+        self.assertEqual(rows[0]['publishing_date'], datetime.date(2021, 3, 4))
+        self.assertEqual(rows[0]['distribution_expenses'], Decimal('1000.25'))
+        self.assertEqual(rows[0]['category_name'], 'Uncategorized')
+        self.assertEqual(rows[1]['source_id'], '0012')
+        self.assertEqual(rows[1]['publishing_date'], datetime.date(2021, 5, 6))
+        self.assertEqual(rows[1]['distribution_expenses'], Decimal('0.00'))
+        self.assertIsNone(rows[1]['publisher'])
+
+    def test_header_aliases_are_mapped_and_reported(self):
+        import pandas as pd
+        from .importer import import_books_from_dataframe
+        df = pd.DataFrame([['T', 'Ann', 'Poetry', '9.5', 'ignored']], columns=[' Book Title', 'Author(s)', 'Genre', 'Expense USD', 'Notes'])
+        with self.settings(BOOK_IMPORT_COLUMN_ALIASES={'category': ['genre']}):
+            result = import_books_from_dataframe(df)
+        self.assertEqual(result['created'], 1)
+        self.assertEqual(result['columns'], {' Book Title': 'title', 'Author(s)': 'authors', 'Genre': 'category', 'Expense USD': 'distribution_expense'})
+        self.assertEqual(Book.objects.get().distribution_expenses, Decimal('9.5'))
+
+    def test_missing_required_columns(self):
+        import pandas as pd
+        from .importer import import_books_from_dataframe
+        with self.assertRaises(ValueError):
+            import_books_from_dataframe(pd.DataFrame([['T']], columns=['title']))
+
+    def test_streams_csv_in_chunks(self):
+        import io
+        from .importer import detect_format, import_books_from_filelike
+        lines = ['id,title,authors,category,distribution_expense']
+        lines += [f'{i},Title {i},A,Poetry,"1,000"' for i in range(25)]
+        f = io.BytesIO('\n'.join(lines).encode())
+        self.assertEqual(detect_format(f), 'csv')
+        result = import_books_from_filelike(f, chunk_size=10, batch_size=7)
+        self.assertEqual(result['created'], 25)
+        self.assertEqual(Book.objects.filter(distribution_expenses=Decimal('1000')).count(), 25)
+
+    def test_streams_xlsx(self):
+        import io
+        from openpyxl import Workbook
+        from .importer import detect_format, import_books_from_filelike
+        wb = Workbook()
+        ws = wb.active
+        ws.append(['title', 'authors', 'category', 'distribution_expense', 'published_date'])
+        ws.append(['One', 'A', 'Poetry', 5, None])
+        ws.append([None, None, None, None, None])
+        ws.append(['Two', 'B', None, '7.25', '2020-01-02'])
+        f = io.BytesIO()
+        wb.save(f)
+        self.assertEqual(detect_format(f), 'xlsx')
+        result = import_books_from_filelike(f, filename='books.csv', chunk_size=1)
+        self.assertEqual((result['created'], result['skipped']), (2, 0))
+        self.assertEqual(Book.objects.get(title='Two').category.name, 'Uncategorized')
+
+    def test_unreadable_file(self):
+        import io
+        from .importer import import_books_from_filelike
+        with self.assertRaises(ValueError):
+            import_books_from_filelike(io.BytesIO(b'PK\x03\x04 not really a zip'))
+
+
+class ImportJobTest(TestCase):
+    def setUp(self):
+        import tempfile
+        from django.contrib.auth.models import User
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.staff = User.objects.create_user('staff', 's@example.com', 'StaffPass123!', is_staff=True)
+        self.other = User.objects.create_user('other', 'o@example.com', 'OtherPass123!', is_staff=True)
+
+    def upload(self, content):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.urls import reverse
+        with self.settings(MEDIA_ROOT=self.media.name, BOOK_IMPORT_RUN_INLINE=True):
+            with self.captureOnCommitCallbacks(execute=True):
+                return self.client.post(reverse('distribution:import_books'), {
+                    'file': SimpleUploadedFile('books.csv', content),
+                })
+
+    def test_upload_runs_job_and_reports_progress(self):
+        from django.urls import reverse
+        from .models import ImportJob
+        self.client.login(username='staff', password='StaffPass123!')
+        resp = self.upload(b'title,authors,category,distribution_expense\nA,X,Poetry,1\n,Y,Poetry,2\nB,Z,Poetry,abc\n')
+        job = ImportJob.objects.get()
+        self.assertRedirects(resp, reverse('distribution:import_job_detail', args=[job.pk]))
+        data = self.client.get(reverse('distribution:import_job_progress', args=[job.pk])).json()
+        self.assertEqual(data['status'], ImportJob.STATUS_FINISHED)
+        self.assertEqual((data['rows_processed'], data['created'], data['skipped']), (3, 2, 1))
+        self.assertEqual(data['columns']['authors'], 'authors')
+        self.assertEqual(Book.objects.count(), 2)
+
+    def test_failed_job_keeps_message(self):
+        from .models import ImportJob
+        self.client.login(username='staff', password='StaffPass123!')
+        self.upload(b'title\nA\n')
+        job = ImportJob.objects.get()
+        self.assertEqual(job.status, ImportJob.STATUS_FAILED)
+        self.assertIn('Missing required columns', job.message)
+
+    def test_finished_job_deletes_upload(self):
+        import os
+        from .models import ImportJob
+        self.client.login(username='staff', password='StaffPass123!')
+        self.upload(b'title,authors,category,distribution_expense\nA,X,Poetry,1\n')
+        job = ImportJob.objects.get()
+        self.assertEqual(job.status, ImportJob.STATUS_FINISHED)
+        self.assertFalse(job.file)
+        self.assertEqual([files for _, _, files in os.walk(self.media.name) if files], [])
+
+    def test_abandoned_running_job_is_reclaimed(self):
+        import datetime
+        from django.core.files.base import ContentFile
+        from django.urls import reverse
+        from django.utils import timezone
+        from .jobs import run_import_job
+        from .models import ImportJob
+        self.client.login(username='staff', password='StaffPass123!')
+        with self.settings(MEDIA_ROOT=self.media.name, BOOK_IMPORT_RUN_INLINE=True):
+            job = ImportJob.objects.create(filename='books.csv', created_by=self.staff, status=ImportJob.STATUS_RUNNING)
+            job.file.save('books.csv', ContentFile(b'title,authors,category,distribution_expense\nA,X,Poetry,1\n'))
+            # a live worker is left alone
+            self.assertFalse(run_import_job(job.pk))
+            ImportJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - datetime.timedelta(hours=1))
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.get(reverse('distribution:import_job_progress', args=[job.pk]))
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.STATUS_FINISHED)
+        self.assertEqual(Book.objects.count(), 1)
+
+    def test_superseded_worker_stops(self):
+        from unittest import mock
+        from django.core.files.base import ContentFile
+        from django.db.models import F
+        from . import jobs
+        from .models import ImportJob
+        with self.settings(MEDIA_ROOT=self.media.name):
+            job = ImportJob.objects.create(filename='books.csv', created_by=self.staff)
+            job.file.save('books.csv', ContentFile(b'title,authors,category,distribution_expense\nA,X,Poetry,1\n'))
+            real_import = jobs.import_books_from_filelike
+
+            def reclaimed_meanwhile(*args, **kwargs):
+                # another worker claims the job before this one writes its first batch
+                ImportJob.objects.filter(pk=job.pk).update(attempt=F('attempt') + 1)
+                return real_import(*args, **kwargs)
+
+            with mock.patch.object(jobs, 'import_books_from_filelike', reclaimed_meanwhile):
+                self.assertFalse(jobs.run_import_job(job.pk))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempt), (ImportJob.STATUS_RUNNING, 2))
+        self.assertTrue(job.file)
+        self.assertEqual(Book.objects.count(), 0)
+
+    def test_other_staff_cannot_see_job(self):
+        from django.urls import reverse
+        from .models import ImportJob
+        self.client.login(username='staff', password='StaffPass123!')
+        self.upload(b'title,authors,category,distribution_expense\nA,X,Poetry,1\n')
+        job = ImportJob.objects.get()
+        self.client.login(username='other', password='OtherPass123!')
+        resp = self.client.get(reverse('distribution:import_job_progress', args=[job.pk]))
+        self.assertEqual(resp.status_code, 404)
+
+
+class ImportBooksCommandTest(TestCase):
+    def test_imports_directory_with_workers(self):
+        import io
+        import os
+        import tempfile
+        from django.core.management import call_command
+        with tempfile.TemporaryDirectory() as tmp:
+            for n in range(2):
+                with open(os.path.join(tmp, f'books{n}.csv'), 'w') as f:
+                    f.write('title,authors,category,distribution_expense\n')
+                    f.writelines(f'T{i},A{n},Poetry,1\n' for i in range(30))
+                    f.write('T0,A0,Poetry,5\n')
+            with open(os.path.join(tmp, 'notes.txt'), 'w') as f:
+                f.write('ignored')
+            with self.settings(BOOK_IMPORT_CHUNK_SIZE=8):
+                call_command('import_books', tmp, workers=2, stdout=io.StringIO())
+        self.assertEqual(Book.objects.count(), 60)
+        self.assertEqual(Book.objects.get(title='T0', author='A0').distribution_expenses, Decimal('5'))
+
+
+class BookDedupeKeyTest(TestCase):
+    def test_key_is_maintained_on_save(self):
+        from .models import book_dedupe_key
+        c = Category.objects.create(name='Poetry')
+        book = Book.objects.create(title='The  Hobbit', author='Tolkien', category=c)
+        self.assertEqual(book.dedupe_key, book_dedupe_key('the hobbit ', 'TOLKIEN'))
+        book.author = 'Someone Else'
+        book.save(update_fields=['author'])
+        book.refresh_from_db()
+        self.assertEqual(book.dedupe_key, book_dedupe_key('The Hobbit', 'Someone Else'))
+
+    def test_importer_matches_unicode_case_variants(self):
+        import pandas as pd
+        from .importer import import_books_from_dataframe
+        c = Category.objects.create(name='Poetry')
+        Book.objects.create(title='Élan Vital', author='Émile', category=c)
+        df = pd.DataFrame([['élan  vital', 'ÉMILE', 'Poetry', '3']], columns=['title', 'authors', 'category', 'distribution_expense'])
+        result = import_books_from_dataframe(df)
+        self.assertEqual((result['created'], result['updated']), (0, 1))
+        self.assertEqual(Book.objects.get().distribution_expenses, Decimal('3'))
+
+    def test_authorless_rows_match_normalized_title(self):
+        import pandas as pd
+        from .importer import import_books_from_dataframe
+        c = Category.objects.create(name='Poetry')
+        Book.objects.create(title='The Hobbit', author='Tolkien', category=c)
+        df = pd.DataFrame([['The  Hobbit ', None, 'Poetry', '4']], columns=['title', 'authors', 'category', 'distribution_expense'])
+        result = import_books_from_dataframe(df)
+        self.assertEqual((result['created'], result['updated']), (0, 1))
+        self.assertEqual(Book.objects.get().distribution_expenses, Decimal('4'))
+
+
+class BookIndexTest(TestCase):
+    def test_list_filters_use_indexes(self):
+        from django.db import connection
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN output checked for SQLite only')
+        qs = Book.objects.filter(category_id=1, publishing_date__gte='2000-01-01').order_by('publishing_date')
+        sql, params = qs.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(str(row) for row in cursor.fetchall())
+        self.assertIn('book_category_date_idx', plan)
+
+
+class BookSearchTest(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.user = User.objects.create_superuser('super', 'super@example.com', 'SuperPass123!')
+        self.client.login(username='super', password='SuperPass123!')
+        self.category = Category.objects.create(name='Fantasy')
+        self.hobbit = Book.objects.create(title='The Hobbit', author='J. R. R. Tolkien', publisher='Allen & Unwin', category=self.category)
+        self.other = Book.objects.create(title='Dune', author='Frank Herbert', publisher='Chilton', category=self.category)
+
+    def search(self, q):
+        from django.urls import reverse
+        resp = self.client.get(reverse('distribution:book_list'), {'q': q})
+        return list(resp.context['books'])
+
+    def test_prefix_search(self):
+        self.assertEqual(self.search('hob tolk'), [self.hobbit])
+        self.assertEqual(self.search('chil'), [self.other])
+        self.assertEqual(self.search('nothing'), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.hobbit.title = 'Silmarillion'
+        self.hobbit.save()
+        self.assertEqual(self.search('silma'), [self.hobbit])
+        self.assertEqual(self.search('hobbit'), [])
+        self.other.delete()
+        self.assertEqual(self.search('dune'), [])
+
+    def test_search_composes_with_other_filters(self):
+        from .search import get_search_backend
+        backend = get_search_backend()
+        found = backend.filter(Book.objects.all(), 'tolk')
+        self.assertEqual(list(found.order_by(backend.rank_ordering or 'title')), [self.hobbit])
+        self.assertEqual(found.filter(category=self.category).count(), 1)
+        self.assertEqual(set(found | Book.objects.filter(title='Dune')), {self.hobbit, self.other})
+        self.assertEqual(list(Book.objects.filter(pk__in=found.values('pk'))), [self.hobbit])
+        self.assertEqual(list(Category.objects.filter(books__in=found)), [self.category])
+
+    def test_backend_selection(self):
+        from django.db import connection
+        from .search import get_search_backend
+        if connection.vendor == 'sqlite':
+            self.assertEqual(get_search_backend().name, 'sqlite_fts')
+        # detected once per alias, not on every search
+        with self.assertNumQueries(0):
+            get_search_backend('default')
+        with self.settings(BOOK_SEARCH_BACKEND='basic'):
+            self.assertEqual(get_search_backend().name, 'basic')
+            self.assertEqual(self.search('Hobb'), [self.hobbit])
+
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        import datetime
+        from django.contrib.auth.models import User
+        User.objects.create_superuser('super', 'super@example.com', 'SuperPass123!')
+        self.client.login(username='super', password='SuperPass123!')
+        self.poetry = Category.objects.create(name='Poetry')
+        self.fiction = Category.objects.create(name='Fiction')
+        for i in range(47):
+            Book.objects.create(
+                title=f'Book {i % 7}', author=f'A{i}', category=self.poetry if i % 3 else self.fiction,
+                publishing_date=None if i % 5 == 0 else datetime.date(2000, 1, 1 + i % 4),
+                distribution_expenses=Decimal(i % 6),
+            )
+
+    def walk(self, url_name, params, key):
+        """
+        Follows next cursors to the end, then previous cursors back to the start.
+        Returns (pks going forwards, pks of every page but the last going backwards).
+        """
+        from django.urls import reverse
+        url = reverse(url_name)
+        seen = []
+        resp = self.client.get(url, params)
+        while True:
+            self.assertTrue(resp.context['cursor_mode'])
+            seen.extend(getattr(o, 'pk') for o in resp.context[key])
+            page = resp.context['page_obj']
+            if not page.has_next():
+                break
+            resp = self.client.get(url, {**params, 'cursor': page.next_cursor})
+        # walk back to the first page
+        back = []
+        while page.has_previous():
+            resp = self.client.get(url, {**params, 'cursor': page.previous_cursor})
+            page = resp.context['page_obj']
+            back = [o.pk for o in resp.context[key]] + back
+        return seen, back
+
+    def test_walks_every_sort_forwards_and_back(self):
+        with self.settings(LIST_PAGINATION='cursor'):
+            for sort in ['title', 'publishing_date', 'category', 'distribution_expenses']:
+                for direction in ['asc', 'desc']:
+                    seen, back = self.walk('distribution:book_list', {'sort': sort, 'dir': direction, 'category': self.poetry.pk}, 'books')
+                    self.assertEqual(len(seen), Book.objects.filter(category=self.poetry).count(), (sort, direction))
+                    self.assertEqual(len(set(seen)), len(seen))
+                    self.assertEqual(len(back), 20)
+                    self.assertEqual(back, seen[:20])
+
+    def test_category_list_by_aggregate(self):
+        with self.settings(LIST_PAGINATION='cursor'):
+            for i in range(25):
+                Category.objects.create(name=f'Empty {i}')
+            seen, back = self.walk('distribution:category_list', {'sort': 'books_count', 'dir': 'desc'}, 'categories')
+        self.assertEqual(len(seen), Category.objects.count())
+        self.assertEqual(seen[:2], [self.poetry.pk, self.fiction.pk])
+        self.assertEqual(back, seen[:20])
+
+    def test_offset_mode_is_default(self):
+        from django.urls import reverse
+        resp = self.client.get(reverse('distribution:book_list'))
+        self.assertFalse(resp.context['cursor_mode'])
+        self.assertEqual(resp.context['page_obj'].paginator.num_pages, 3)
+
+
+class CategoryRollupTest(TestCase):
+    def setUp(self):
+        import datetime
+        self.poetry = Category.objects.create(name='Poetry')
+        self.fiction = Category.objects.create(name='Fiction')
+        self.a = Book.objects.create(title='A', author='X', category=self.poetry, distribution_expenses=Decimal('10'), publishing_date=datetime.date(2001, 1, 1))
+        self.b = Book.objects.create(title='B', author='Y', category=self.poetry, distribution_expenses=Decimal('5.5'), publishing_date=datetime.date(1999, 6, 1))
+
+    def assertMatchesBooks(self):
+        from .models import CategoryRollup
+        from .rollups import compute_category_rollups, rollup_values
+        stored = {r.category_id: rollup_values(r) for r in CategoryRollup.objects.all()}
+        for rollup in compute_category_rollups():
+            if rollup.book_count or rollup.category_id in stored:
+                self.assertEqual(stored.get(rollup.category_id), rollup_values(rollup))
+
+    def test_signals_keep_rollups_current(self):
+        import datetime
+        rollup = self.poetry.rollup
+        self.assertEqual((rollup.book_count, rollup.total_expense), (2, Decimal('15.50')))
+        self.assertEqual(rollup.first_publishing_date, datetime.date(1999, 6, 1))
+        self.b.category = self.fiction
+        self.b.distribution_expenses = Decimal('7')
+        self.b.save()
+        self.assertMatchesBooks()
+        self.a.delete()
+        self.assertMatchesBooks()
+        self.poetry.rollup.refresh_from_db()
+        self.assertEqual((self.poetry.rollup.book_count, self.poetry.rollup.first_publishing_date), (0, None))
+
+    def test_import_and_bulk_delete_apply_deltas(self):
+        import pandas as pd
+        from django.contrib.auth.models import User
+        from django.urls import reverse
+        from .importer import import_books_from_dataframe
+        df = pd.DataFrame(
+            [['A', 'X', 'Fiction', '3'], ['C', 'Z', 'Poetry', '2'], ['D', 'Z', 'Drama', '1']],
+            columns=['title', 'authors', 'category', 'distribution_expense'],
+        )
+        import_books_from_dataframe(df)
+        self.assertMatchesBooks()
+        User.objects.create_superuser('super', 'super@example.com', 'SuperPass123!')
+        self.client.login(username='super', password='SuperPass123!')
+        ids = list(Book.objects.filter(author__in=['X', 'Z']).values_list('pk', flat=True))
+        self.client.post(reverse('distribution:book_bulk_delete'), {'selected': ids})
+        self.assertMatchesBooks()
+        self.assertEqual(Book.objects.count(), 1)
+
+    def test_rebuild_command_and_category_list(self):
+        import io
+        from django.contrib.auth.models import User
+        from django.core.management import call_command
+        from django.urls import reverse
+        from .models import CategoryRollup
+        CategoryRollup.objects.filter(pk=self.poetry.pk).update(book_count=99)
+        out = io.StringIO()
+        call_command('rebuild_category_rollups', stdout=out)
+        self.assertIn('2 were out of date', out.getvalue())
+        self.assertMatchesBooks()
+        User.objects.create_user('u', password='UserPass123!')
+        self.client.login(username='u', password='UserPass123!')
+        resp = self.client.get(reverse('distribution:category_list'), {'sort': 'total_expense', 'dir': 'desc'})
+        cats = list(resp.context['categories'])
+        self.assertEqual([c.name for c in cats], ['Poetry', 'Fiction'])
+        self.assertEqual((cats[0].books_count, cats[0].total_expense), (2, Decimal('15.50')))
+
+
+class MonthlyExpenseReportTest(TestCase):
+    def setUp(self):
+        import datetime
+        from django.contrib.auth.models import User
+        User.objects.create_user('u', password='UserPass123!')
+        self.client.login(username='u', password='UserPass123!')
+        self.poetry = Category.objects.create(name='Poetry')
+        self.fiction = Category.objects.create(name='Fiction')
+        for i in range(40):
+            Book.objects.create(
+                title=f'B{i}', author='A', category=self.poetry if i % 3 else self.fiction,
+                publishing_date=None if i % 7 == 0 else datetime.date(2020, 1, 1) + datetime.timedelta(days=i * 11),
+                distribution_expenses=Decimal(i) + Decimal('0.25'),
+            )
+
+    def expected(self, start=None, end=None):
+        from django.db.models import Sum
+        qs = Book.objects.all()
+        if start:
+            qs = qs.filter(publishing_date__gte=start)
+        if end:
+            qs = qs.filter(publishing_date__lte=end)
+        rows = qs.values('category__name').annotate(total=Sum('distribution_expenses')).order_by('-total')
+        return [{'category': r['category__name'], 'total': float(r['total'])} for r in rows]
+
+    def report(self, start=None, end=None):
+        from django.urls import reverse
+        params = {k: v for k, v in (('start_date', start), ('end_date', end)) if v}
+        return self.client.get(reverse('distribution:expenses_by_category_json'), params).json()
+
+    def assertReportsMatch(self):
+        ranges = [
+            (None, None), ('2020-01-01', None), (None, '2020-06-30'), ('2020-02-15', '2020-09-03'),
+            ('2020-03-01', '2020-03-31'), ('2020-03-05', '2020-03-20'), ('2020-04-10', '2021-01-31'),
+        ]
+        for start, end in ranges:
+            self.assertEqual(self.report(start, end), self.expected(start, end), (start, end))
+
+    def test_report_combines_buckets_and_edges(self):
+        self.assertReportsMatch()
+
+    def test_buckets_follow_writes(self):
+        import datetime
+        book = Book.objects.filter(publishing_date__isnull=False).first()
+        book.publishing_date = datetime.date(2020, 8, 30)
+        book.category = self.fiction
+        book.save()
+        Book.objects.filter(title__in=['B5', 'B6']).delete()
+        self.assertReportsMatch()
+
+    def test_moved_book_leaves_no_empty_bucket(self):
+        import datetime
+        from .models import MonthlyCategoryExpense
+        from .rollups import rebuild_monthly_expenses
+        book = Book.objects.create(
+            title='Alone', author='A', category=self.poetry, publishing_date=datetime.date(1990, 5, 5),
+            distribution_expenses=Decimal('3.10'),
+        )
+        book.category = self.fiction
+        book.save()
+        book.publishing_date = datetime.date(1991, 5, 5)
+        book.save()
+        self.assertFalse(MonthlyCategoryExpense.objects.filter(book_count=0).exists())
+        Book.objects.filter(pk=book.pk).delete()
+        self.assertFalse(MonthlyCategoryExpense.objects.filter(book_count=0).exists())
+        self.assertEqual(rebuild_monthly_expenses(), 0)
+
+    def test_rebuild_reports_drift(self):
+        import io
+        from django.core.management import call_command
+        from .models import MonthlyCategoryExpense
+        MonthlyCategoryExpense.objects.filter(pk=MonthlyCategoryExpense.objects.first().pk).update(total_expense=0)
+        out = io.StringIO()
+        call_command('rebuild_category_rollups', stdout=out)
+        self.assertIn('1 bucket(s) were out of date', out.getvalue())
+        self.assertReportsMatch()
+
+    def test_invalid_date_is_rejected(self):
+        from django.urls import reverse
+        resp = self.client.get(reverse('distribution:expenses_by_category_json'), {'start_date': '2020-13-40'})
+        self.assertEqual(resp.status_code, 400)
+
+
+class ReportCacheTest(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from django.core.cache import cache
+        cache.clear()
+        self.staff = User.objects.create_user('staff', password='StaffPass123!', is_staff=True)
+        self.client.login(username='staff', password='StaffPass123!')
+        self.poetry = Category.objects.create(name='Poetry')
+        Book.objects.create(title='A', author='X', category=self.poetry, distribution_expenses=Decimal('10'))
+
+    def get(self, **headers):
+        from django.urls import reverse
+        return self.client.get(reverse('distribution:expenses_by_category_json'), {'start_date': '', 'end_date': ''}, headers=headers)
+
+    def test_cached_until_a_write(self):
+        self.get()
+        with self.assertNumQueries(2):  # session + user
+            self.assertEqual(self.get().json(), [{'category': 'Poetry', 'total': 10.0}])
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.create(title='B', author='X', category=self.poetry, distribution_expenses=Decimal('5'))
+        self.assertEqual(self.get().json(), [{'category': 'Poetry', 'total': 15.0}])
+        self.poetry.name = 'Verse'
+        self.poetry.save()
+        self.assertEqual(self.get().json(), [{'category': 'Verse', 'total': 15.0}])
+
+    def test_etag_and_stats(self):
+        from django.urls import reverse
+        resp = self.get()
+        etag = resp['ETag']
+        self.assertEqual(self.get(if_none_match=etag).status_code, 304)
+        Book.objects.create(title='B', author='X', category=self.poetry, distribution_expenses=Decimal('5'))
+        self.assertEqual(self.get(if_none_match=etag).status_code, 200)
+        stats = self.client.get(reverse('distribution:report_cache_stats')).json()
+        self.assertEqual((stats['hits'], stats['misses'], stats['not_modified']), (0, 2, 1))
+        self.assertEqual(stats['hit_rate'], round(1 / 3, 4))
+
+
+class ExpenseAnalyticsTest(TestCase):
+    def setUp(self):
+        import datetime
+        from django.contrib.auth.models import User
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.create_user('u', password='UserPass123!')
+        self.client.login(username='u', password='UserPass123!')
+        cats = [Category.objects.create(name=n) for n in ('Poetry', 'Fiction', 'Drama', 'Essays')]
+        for i in range(24):
+            Book.objects.create(
+                title=f'B{i}', author=f'A{i % 4}', publisher=None if i % 5 == 0 else f'P{i % 2}',
+                category=cats[i % 4], created_by=self.user if i % 2 else None,
+                publishing_date=datetime.date(2020 + i % 2, 1 + i % 12, 10),
+                distribution_expenses=Decimal(i) + Decimal('0.10'),
+            )
+
+    def get(self, **params):
+        from django.urls import reverse
+        return self.client.get(reverse('distribution:expense_analytics_json'), params)
+
+    def test_groups_and_decimal_totals(self):
+        from django.db.models import Sum
+        data = self.get(group_by='category').json()
+        expected = {
+            r['category__name']: r['t'] for r in Book.objects.values('category__name').annotate(t=Sum('distribution_expenses'))
+        }
+        self.assertEqual({r['category']: Decimal(r['total']) for r in data['rows']}, expected)
+        self.assertEqual(Decimal(data['total']), sum(expected.values()))
+        self.assertEqual(data['count'], 24)
+        publishers = {r['publisher'] for r in self.get(group_by='publisher').json()['rows']}
+        self.assertEqual(publishers, {'', 'P0', 'P1'})
+
+    def test_time_series_with_top_n_and_other(self):
+        with self.assertNumQueries(3):  # session + user + the report
+            data = self.get(group_by='author,quarter', top=2, start_date='2020-01-01', end_date='2021-12-31').json()
+        self.assertEqual({r['author'] for r in data['rows'] if not r['other']}, {'A2', 'A3'})
+        data = self.get(group_by='category,quarter', top=2, start_date='2020-01-01', end_date='2021-12-31').json()
+        rows = data['rows']
+        self.assertEqual(data['count'], 24)
+        leaders = {r['category'] for r in rows if not r['other']}
+        self.assertEqual(leaders, {'Drama', 'Essays'})
+        others = [r for r in rows if r['other']]
+        self.assertTrue(others)
+        self.assertTrue(all(r['category'] is None for r in others))
+        self.assertEqual(sum(Decimal(r['total']) for r in others), Decimal('127.20'))
+        self.assertEqual([r['quarter'] for r in rows], sorted(r['quarter'] for r in rows))
+
+    def test_buckets_match_book_rows(self):
+        import datetime
+        from .reports import expense_analytics
+        Book.objects.create(title='Undated', author='A0', category=Category.objects.get(name='Drama'), distribution_expenses=Decimal('3'))
+        cases = [
+            (['category'], None, None, None), (['month'], None, None, None), (['category', 'year'], None, None, 2),
+            (['quarter', 'category'], datetime.date(2020, 2, 14), datetime.date(2021, 5, 20), None),
+            (['category'], datetime.date(2020, 3, 1), datetime.date(2020, 3, 20), None),
+            (['month'], datetime.date(2020, 4, 1), None, None),
+        ]
+        for group_by, start, end, top in cases:
+            fast = expense_analytics(group_by, start, end, top=top)
+            slow = expense_analytics(group_by, start, end, top=top, use_buckets=False)
+            key = lambda r: sorted((k, str(v)) for k, v in r.items())
+            self.assertEqual(sorted(map(key, fast['rows'])), sorted(map(key, slow['rows'])), group_by)
+            self.assertEqual((fast['total'], fast['count']), (slow['total'], slow['count']))
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.get(group_by='isbn').status_code, 400)
+        self.assertEqual(self.get(group_by='month,year').status_code, 400)
+        self.assertEqual(self.get(group_by='category', top='0').status_code, 400)
+
+
+class BookExportTest(TestCase):
+    def setUp(self):
+        import datetime
+        from django.contrib.auth.models import User
+        User.objects.create_user('u', password='UserPass123!')
+        self.client.login(username='u', password='UserPass123!')
+        poetry = Category.objects.create(name='Poetry')
+        fiction = Category.objects.create(name='Fiction')
+        for i in range(30):
+            Book.objects.create(
+                source_id=f'S{i}', title=f'Book {i:02d} & "more"', author=f'A{i}', publisher=None if i % 4 else 'Pub <x>',
+                publishing_date=datetime.date(2020, 1 + i % 12, 1) if i % 5 else None,
+                category=poetry if i % 2 else fiction, distribution_expenses=Decimal(i) + Decimal('0.5'),
+            )
+        self.poetry = poetry
+
+    def export(self, **params):
+        from django.urls import reverse
+        resp = self.client.get(reverse('distribution:book_export'), params)
+        self.assertTrue(resp.streaming)
+        return resp, b''.join(resp.streaming_content)
+
+    def test_csv_follows_list_filters_and_sort(self):
+        import csv
+        import io
+        resp, body = self.export(category=self.poetry.pk, sort='title', dir='desc', format='csv')
+        self.assertIn('attachment', resp['Content-Disposition'])
+        rows = list(csv.reader(io.StringIO(body.decode('utf-8'))))
+        self.assertEqual(rows[0], ['id', 'title', 'subtitle', 'authors', 'publisher', 'published_date', 'category', 'distribution_expense'])
+        expected = list(Book.objects.filter(category=self.poetry).order_by('-title').values_list('title', flat=True))
+        self.assertEqual([r[1] for r in rows[1:]], expected)
+        # relevance-ordered searches export too
+        _, body = self.export(q='Book 1', format='csv')
+        self.assertEqual(len(body.decode('utf-8').splitlines()), 11)
+
+    def test_exports_round_trip_through_importer(self):
+        import io
+        from .importer import import_books_from_filelike
+        before = sorted(Book.objects.values_list('source_id', 'title', 'author', 'publisher', 'publishing_date', 'category__name', 'distribution_expenses'))
+        for fmt in ('csv', 'xlsx'):
+            _, body = self.export(format=fmt)
+            Book.objects.all().delete()
+            result = import_books_from_filelike(io.BytesIO(body), filename=f'books.{fmt}')
+            self.assertEqual((result['created'], result['skipped']), (30, 0), fmt)
+            after = sorted(Book.objects.values_list('source_id', 'title', 'author', 'publisher', 'publishing_date', 'category__name', 'distribution_expenses'))
+            self.assertEqual(after, before, fmt)
+
+    def test_unknown_format(self):
+        from django.urls import reverse
+        self.assertEqual(self.client.get(reverse('distribution:book_export'), {'format': 'pdf'}).status_code, 400)
+
+
+class BulkDeleteCategoriesTest(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.poetry = Category.objects.create(name='Poetry')
+        self.empty = [Category.objects.create(name=f'Empty {n}') for n in range(3)]
+        Book.objects.create(title='A', author='X', category=self.poetry, distribution_expenses=Decimal('10'))
+        User.objects.create_superuser('super', 'super@example.com', 'SuperPass123!')
+        self.client.login(username='super', password='SuperPass123!')
+
+    def test_deletes_empty_categories_and_names_skipped(self):
+        from django.contrib.messages import get_messages
+        from django.urls import reverse
+        from .models import CategoryRollup, MonthlyCategoryExpense
+        ids = [self.poetry.pk] + [c.pk for c in self.empty]
+        resp = self.client.post(reverse('distribution:category_bulk_delete'), {'selected': ids})
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(list(Category.objects.values_list('name', flat=True)), ['Poetry'])
+        self.assertEqual(list(CategoryRollup.objects.values_list('category_id', flat=True)), [self.poetry.pk])
+        self.assertFalse(MonthlyCategoryExpense.objects.exclude(category=self.poetry).exists())
+        texts = [str(m) for m in get_messages(resp.wsgi_request)]
+        self.assertIn('Deleted 3 categor(y/ies)', texts)
+        self.assertIn('Skipped 1 category(ies) that have related books: Poetry', texts)
+
+    def test_query_count_does_not_grow_with_selection(self):
+        from .bulk import delete_empty_categories
+        more = [Category.objects.create(name=f'More {n}') for n in range(20)]
+        # check, savepoint, three DELETEs, release
+        with self.assertNumQueries(6):
+            deleted, skipped = delete_empty_categories(Category.objects.filter(pk__in=[c.pk for c in self.empty + more]))
+        self.assertEqual((deleted, skipped), (23, []))
+
+
+class BulkDeleteBooksTest(TestCase):
+    def setUp(self):
+        import datetime
+        from django.contrib.auth.models import Group, User
+        self.poetry = Category.objects.create(name='Poetry')
+        self.fiction = Category.objects.create(name='Fiction')
+        self.admin = User.objects.create_user('admin1', password='AdminPass123!')
+        self.admin.groups.add(Group.objects.get_or_create(name='Admin')[0])
+        self.other = User.objects.create_user('admin2', password='AdminPass123!')
+        for n in range(7):
+            Book.objects.create(
+                title=f'P{n}', author='X', category=self.poetry, created_by=self.admin,
+                distribution_expenses=Decimal('1.50'), publishing_date=datetime.date(2020, n + 1, 1),
+            )
+        Book.objects.create(
+            title='F', author='Y', category=self.fiction, created_by=self.other,
+            distribution_expenses=Decimal('4'), publishing_date=datetime.date(2021, 1, 1),
+        )
+
+    def post(self, **data):
+        from django.urls import reverse
+        return self.client.post(reverse('distribution:book_bulk_delete'), data)
+
+    def test_delete_all_matching_filters_in_chunks(self):
+        from .models import CategoryRollup, MonthlyCategoryExpense
+        from .rollups import compute_category_rollups, rollup_values
+        self.client.login(username='admin1', password='AdminPass123!')
+        with self.settings(BOOK_DELETE_CHUNK_SIZE=3):
+            self.post(scope='filtered', next=f'category={self.poetry.pk}&sort=title')
+        self.assertEqual(list(Book.objects.values_list('title', flat=True)), ['F'])
+        stored = {r.category_id: rollup_values(r) for r in CategoryRollup.objects.all()}
+        self.assertEqual(stored, {r.category_id: rollup_values(r) for r in compute_category_rollups()})
+        self.assertFalse(MonthlyCategoryExpense.objects.filter(category=self.poetry).exists())
+
+    def test_plain_user_cannot_delete_others_books(self):
+        from django.contrib.auth.models import User
+        User.objects.create_user('plain', password='PlainPass123!')
+        self.client.login(username='plain', password='PlainPass123!')
+        self.post(scope='filtered', next='start=1900-01-01')
+        self.post(selected=list(Book.objects.values_list('pk', flat=True)))
+        self.assertEqual(Book.objects.count(), 8)
+
+    def test_ownership_is_checked_across_all_matches(self):
+        self.client.login(username='admin1', password='AdminPass123!')
+        self.post(scope='filtered', next='q=&start=1900-01-01')
+        self.post(scope='filtered', next='')
+        self.assertEqual(Book.objects.count(), 8)
+
+    def test_selected_ids_still_supported(self):
+        self.client.login(username='admin1', password='AdminPass123!')
+        ids = list(Book.objects.filter(title__in=['P0', 'P1']).values_list('pk', flat=True))
+        self.post(selected=ids)
+        self.assertEqual(Book.objects.count(), 6)
+        self.assertEqual(self.poetry.rollup.book_count, 5)
+
+
+class RequestInstrumentationTest(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from rumipress.instrumentation import reset_request_stats
+        reset_request_stats()
+        User.objects.create_superuser('super', 'super@example.com', 'SuperPass123!')
+        User.objects.create_user('u', password='UserPass123!')
+
+    def test_server_timing_header_and_stats(self):
+        from django.urls import reverse
+        self.client.login(username='super', password='SuperPass123!')
+        with self.settings(SERVER_TIMING_HEADER=True):
+            resp = self.client.get(reverse('distribution:book_list'))
+        self.assertRegex(resp['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", render;dur=[\d.]+, total;dur=[\d.]+$')
+        self.client.get(reverse('distribution:book_list'))
+        stats = self.client.get(reverse('request_stats')).json()
+        entry = stats['distribution:book_list']
+        self.assertEqual(entry['requests'], 2)
+        self.assertLessEqual(entry['total_ms_p50'], entry['total_ms_p95'])
+        self.assertEqual(entry['query_budget'], 12)
+
+    def test_stats_are_superuser_only(self):
+        from django.urls import reverse
+        self.client.login(username='u', password='UserPass123!')
+        self.assertEqual(self.client.get(reverse('request_stats')).status_code, 302)
+
+    def test_query_budget_raises_or_logs(self):
+        from django.urls import reverse
+        from rumipress.instrumentation import QueryBudgetExceeded
+        self.client.login(username='u', password='UserPass123!')
+        with self.settings(QUERY_BUDGETS={'distribution:book_list': 1}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(reverse('distribution:book_list'))
+            with self.settings(QUERY_BUDGET_ACTION='log'), self.assertLogs('rumipress.instrumentation', 'WARNING'):
+                resp = self.client.get(reverse('distribution:book_list'))
+        self.assertEqual(resp.status_code, 200)
+
+
+class BenchmarkSuiteTest(TestCase):
+    def test_generate_catalogue_command(self):
+        import io
+        from django.contrib.auth.models import User
+        from django.core.management import call_command
+        from .models import CategoryRollup
+        from .rollups import compute_category_rollups, rollup_values
+        out = io.StringIO()
+        call_command('generate_catalogue', '--books', '300', '--categories', '6', '--admins', '2', stdout=out)
+        self.assertIn('Created 300 synthetic book(s)', out.getvalue())
+        self.assertEqual(Book.objects.count(), 300)
+        self.assertEqual(Category.objects.count(), 6)
+        self.assertEqual(User.objects.filter(groups__name='Admin').count(), 2)
+        # long tail: the first category is the largest
+        sizes = {c.name: c.books.count() for c in Category.objects.all()}
+        self.assertEqual(max(sizes, key=sizes.get), 'Fiction')
+        stored = {r.category_id: rollup_values(r) for r in CategoryRollup.objects.all()}
+        self.assertEqual(stored, {r.category_id: rollup_values(r) for r in compute_category_rollups()})
+
+    def test_suite_runs_and_rolls_back_writes(self):
+        from .benchmarks import compare_results, run_suite
+        from .synthetic import generate_catalogue
+        from django.contrib.auth.models import User
+        generate_catalogue(200, 5, admins=1)
+        user = User.objects.create_superuser('bench', 'bench@example.com', None)
+        users = User.objects.count()
+        results = run_suite(user, import_sizes=[50], repeat=1)
+        names = [r['name'] for r in results]
+        for name in ['importer:50_rows', 'book_list:sort=author:desc', 'category_list:default',
+                     'expense_json:year:cold', 'bulk_delete:books_in_largest_category']:
+            self.assertIn(name, names)
+        self.assertTrue(all(r['median_ms'] >= 0 and r['queries'] > 0 for r in results))
+        self.assertEqual(Book.objects.count(), 200)
+        self.assertEqual(Category.objects.count(), 5)
+        self.assertEqual(User.objects.count(), users)
+        slower = {'results': [dict(r, median_ms=r['median_ms'] * 2 + 1) for r in results]}
+        self.assertTrue(all(row[4] for row in compare_results({'results': results}, slower)))
+
+
+class DatabaseSettingsTest(TestCase):
+    def test_sqlite_reader_not_blocked_by_open_write(self):
+        import os
+        import tempfile
+        from django.conf import settings
+        from django.db import connection
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite only')
+        with tempfile.TemporaryDirectory() as directory:
+            config = {**connection.settings_dict, 'NAME': os.path.join(directory, 'wal.sqlite3')}
+            config['OPTIONS'] = settings.DATABASES['default']['OPTIONS']
+            writer, reader = DatabaseWrapper(config, 'writer'), DatabaseWrapper(config, 'reader')
+            try:
+                with writer.cursor() as cursor:
+                    self.assertEqual(cursor.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+                    self.assertEqual(cursor.execute('PRAGMA synchronous').fetchone()[0], 1)
+                    cursor.execute('CREATE TABLE t (n integer)')
+                    cursor.execute('INSERT INTO t VALUES (1)')
+                writer.set_autocommit(False)
+                with writer.cursor() as cursor:
+                    # an import-style write transaction left open
+                    cursor.execute('INSERT INTO t VALUES (2)')
+                    with reader.cursor() as read:
+                        self.assertEqual(read.execute('SELECT count(*) FROM t').fetchone()[0], 1)
+                writer.rollback()
+            finally:
+                writer.close()
+                reader.close()
+
+
+class ReplicaRoutingTest(TransactionTestCase):
+    # committed rows, so the replica connection (a test mirror of 'default') sees them
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        c = Category.objects.create(name='Poetry')
+        self.book = Book.objects.create(title='A', author='X', category=c, distribution_expenses=Decimal('10'))
+        User.objects.create_superuser('super', 'super@example.com', 'SuperPass123!')
+        self.client.login(username='super', password='SuperPass123!')
+
+    def reads(self, url, **params):
+        from django.db import connections
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connections['replica']) as replica:
+            resp = self.client.get(url, params)
+        self.assertEqual(resp.status_code, 200)
+        return len(replica.captured_queries)
+
+    def test_read_views_use_replica_until_user_writes(self):
+        from django.test import override_settings
+        from django.urls import reverse
+        from rumipress.db_router import STICKY_COOKIE
+        with override_settings(REPLICA_DATABASE='replica'):
+            self.assertGreater(self.reads(reverse('distribution:book_list')), 0)
+            self.assertGreater(self.reads(reverse('distribution:book_list'), q='A'), 0)
+            self.assertGreater(self.reads(reverse('distribution:category_list')), 0)
+            self.assertGreater(self.reads(reverse('distribution:book_detail', args=[self.book.pk])), 0)
+            self.assertGreater(self.reads(reverse('distribution:expenses_by_category_json')), 0)
+            self.assertEqual(self.reads(reverse('distribution:book_add')), 0)
+            resp = self.client.post(reverse('distribution:category_add'), {'name': 'Drama'})
+            self.assertEqual(resp.status_code, 302)
+            self.assertIn(STICKY_COOKIE, resp.cookies)
+            self.assertEqual(self.reads(reverse('distribution:category_list')), 0)
+            del self.client.cookies[STICKY_COOKIE]
+            self.assertGreater(self.reads(reverse('distribution:category_list')), 0)
+
+    def test_replica_report_is_not_revalidated(self):
+        from django.test import override_settings
+        from django.urls import reverse
+        url = reverse('distribution:expenses_by_category_json')
+        etag = self.client.get(url)['ETag']
+        with override_settings(REPLICA_DATABASE='replica'):
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(resp.status_code, 200)
+            self.assertFalse(resp.has_header('ETag'))
+            self.client.post(reverse('distribution:category_add'), {'name': 'Drama'})
+            self.client.cookies.pop('db_primary', None)
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=resp.get('ETag', etag))
+            self.assertEqual(resp.status_code, 200)
+
+    def test_off_without_replica(self):
+        from django.urls import reverse
+        self.assertEqual(self.reads(reverse('distribution:book_list')), 0)
+
+    def test_router(self):
+        from django.test import override_settings
+        from rumipress.db_router import ReplicaRouter, read_from_replica
+        router = ReplicaRouter()
+        with override_settings(REPLICA_DATABASE='replica'):
+            self.assertIsNone(router.db_for_read(Book))
+            with read_from_replica():
+                self.assertEqual(router.db_for_read(Book), 'replica')
+                self.assertEqual(router.db_for_write(Book), 'default')
+                book = Book.objects.get(pk=self.book.pk)
+            self.assertEqual(book._state.db, 'replica')
+            self.assertTrue(router.allow_relation(book, Category.objects.get(name='Poetry')))
+            self.assertFalse(router.allow_migrate('replica', 'distribution'))
+            self.assertTrue(router.allow_migrate('default', 'distribution'))
+
+
+class CategoryChoicesTest(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from django.core.cache import cache
+        cache.clear()
+        self.poetry = Category.objects.create(name='Poetry')
+        self.drama = Category.objects.create(name='Drama')
+        User.objects.create_superuser('super', 'super@example.com', 'SuperPass123!')
+        self.client.login(username='super', password='SuperPass123!')
+
+    def test_cached_until_categories_change(self):
+        from .bulk import delete_empty_categories
+        from .choices import category_choices
+        expected = [(self.drama.pk, 'Drama'), (self.poetry.pk, 'Poetry')]
+        self.assertEqual(category_choices(), expected)
+        with self.assertNumQueries(0):
+            self.assertEqual(category_choices(), expected)
+        fiction = Category.objects.create(name='Fiction')
+        self.assertEqual([name for _, name in category_choices()], ['Drama', 'Fiction', 'Poetry'])
+        # the set-based delete skips the signals
+        delete_empty_categories(Category.objects.filter(pk=fiction.pk))
+        self.assertEqual(category_choices(), expected)
+
+    def test_importer_created_categories_invalidate(self):
+        import pandas as pd
+        from .choices import category_choices
+        from .importer import import_books_from_dataframe
+        category_choices()
+        import_books_from_dataframe(pd.DataFrame(
+            [[1, 'New', None, 'Author', None, None, 'Travel', '10']],
+            columns=['id', 'title', 'subtitle', 'authors', 'publisher', 'published_date', 'category', 'distribution_expense'],
+        ))
+        self.assertIn('Travel', [name for _, name in category_choices()])
+
+    def test_list_and_form_use_choices(self):
+        from django.urls import reverse
+        from .forms import BookForm
+        resp = self.client.get(reverse('distribution:book_list'))
+        self.assertContains(resp, f'<option value="{self.poetry.pk}" >Poetry</option>', html=False)
+        with self.assertNumQueries(0):
+            form = BookForm()
+            html = str(form['category'])
+        self.assertIn(f'<option value="{self.drama.pk}">Drama</option>', html)
+        form = BookForm(data={'title': 'T', 'author': 'A', 'category': self.drama.pk, 'distribution_expenses': '5'})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.save().category, self.drama)
+        self.assertFalse(BookForm(data={'title': 'T', 'author': 'A', 'category': 999999, 'distribution_expenses': '5'}).is_valid())
+
+    def test_typeahead_past_select_limit(self):
+        from django.test import override_settings
+        from django.urls import reverse
+        from .forms import BookForm
+        with override_settings(CATEGORY_SELECT_LIMIT=1):
+            resp = self.client.get(reverse('distribution:book_list'), {'category': self.poetry.pk})
+            self.assertContains(resp, 'data-category-typeahead')
+            self.assertContains(resp, 'value="Poetry"')
+            self.assertNotContains(resp, '<option value="')
+            self.assertIn('data-category-typeahead', str(BookForm()['category']))
+            form = BookForm(data={'title': 'T', 'author': 'A', 'category': self.poetry.pk, 'distribution_expenses': '5'})
+            self.assertTrue(form.is_valid(), form.errors)
+
+    def test_search_endpoint(self):
+        from django.urls import reverse
+        Category.objects.create(name='Modern Poetry')
+        Category.objects.create(name='Poems')
+        url = reverse('distribution:category_search_json')
+        names = [r['name'] for r in self.client.get(url, {'q': 'poe'}).json()['results']]
+        self.assertEqual(names, ['Poems', 'Poetry', 'Modern Poetry'])
+        self.assertEqual(len(self.client.get(url, {'q': 'poe', 'limit': 1}).json()['results']), 1)
+        self.assertEqual(len(self.client.get(url).json()['results']), 4)
+        self.assertEqual(self.client.get(url, {'limit': 'x'}).status_code, 400)
+
+
+class CacheVersionTest(TestCase):
+    def test_bump_now_and_after_commit(self):
+        from django.core.cache import cache
+        from rumipress.versioning import bump_cache_version, cache_version
+        cache.delete('tests:version')
+        self.assertEqual(cache_version('tests:version'), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_cache_version('tests:version')
+            self.assertEqual(cache_version('tests:version'), 2)
+        self.assertEqual(cache_version('tests:version'), 3)
+        # an evicted stamp restarts past the first version
+        cache.delete('tests:version')
+        bump_cache_version('tests:version')
+        self.assertEqual(cache_version('tests:version'), 2)
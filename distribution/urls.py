@@ -9,14 +9,18 @@ urlpatterns = [
     path('categories/<int:pk>/edit/', views.CategoryUpdateView.as_view(), name='category_edit'),
     path('categories/<int:pk>/delete/', views.CategoryDeleteView.as_view(), name='category_delete'),
     path('categories/bulk-delete/', views.bulk_delete_categories, name='category_bulk_delete'),
+    path('categories/search/', views.category_search_json, name='category_search_json'),
     
     path("books/", views.BookListView.as_view(), name="book_list"),
+    path("books/export/", views.BookExportView.as_view(), name="book_export"),
     path("books/add/", views.BookCreateView.as_view(), name="book_add"),
     path("books/<int:pk>/edit/", views.BookUpdateView.as_view(), name="book_edit"),
     path("books/<int:pk>/delete/", views.BookDeleteView.as_view(), name="book_delete"),
     path("books/<int:pk>/", views.BookDetailView.as_view(), name="book_detail"),
     
     path("import/", views.import_books_view, name="import_books"),
+    path("import/jobs/<int:pk>/", views.import_job_detail, name="import_job_detail"),
+    path("import/jobs/<int:pk>/progress/", views.import_job_progress, name="import_job_progress"),
     
     # Bulk delete
     path("books/bulk-delete/", views.bulk_delete_books, name="book_bulk_delete"),
@@ -25,5 +29,7 @@ urlpatterns = [
     path("reports/", views.ExpensesReportView.as_view(), name="reports"),
     path("reports/expenses/", views.ExpensesReportView.as_view(), name="expenses_report"),
     path("api/reports/expense_by_category/", views.expenses_by_category_json, name="expenses_by_category_json"),
+    path("api/reports/expenses/", views.expense_analytics_json, name="expense_analytics_json"),
+    path("api/reports/cache_stats/", views.report_cache_stats_json, name="report_cache_stats"),
     
 ]
@@ -1,4 +1,4 @@
-from django.shortcuts import render, redirect
+from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
 from django.urls import reverse, reverse_lazy
@@ -6,33 +6,49 @@ from django.views.generic import ListView, CreateView, UpdateView, DeleteView, D
 from django.contrib.messages.views import SuccessMessageMixin
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
-from .models import Category, Book
+from .models import Category, Book, ImportJob
 from .forms import CategoryForm, BookForm, UploadBooksForm
-from django.http import  JsonResponse
-from .importer import import_books_from_filelike
+from django.http import  QueryDict, JsonResponse, HttpResponseBadRequest, StreamingHttpResponse
+from .bulk import delete_books, delete_empty_categories
+from .choices import CategoryTypeaheadInput, category_choices, search_categories
+from .exporter import EXPORT_FORMATS, iter_export_rows
+from .jobs import enqueue_import_job, requeue_if_stale
+from .pagination import KeysetPaginationMixin
+from .reports import (
+    REPORT_NOT_MODIFIED_KEY, cached_report, count_report_event, expense_analytics, expense_totals_by_category,
+    report_cache_stats, report_etag,
+)
+from .search import get_search_backend
 from django.db.models.functions import Coalesce
-from django.db.models import Sum, Count, Value, DecimalField
+from django.db.models import Value, DecimalField
 from django.views.decorators.http import require_POST
-from django.db.models import Q
-from django.db.models.deletion import ProtectedError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.views.decorators.cache import cache_control
+from django.db.models import Count, Q
 from accounts.mixins import AuditLoggingMixin, AdminReadOnlyEnforcementMixin, is_admin
+from rumipress.db_router import reading_from_replica, replica_reads
 
-class CategoryListView(LoginRequiredMixin, AuditLoggingMixin, ListView):
+class CategoryListView(LoginRequiredMixin, AuditLoggingMixin, KeysetPaginationMixin, ListView):
     model = Category
     template_name = 'distribution/category_list.html'
     context_object_name = 'categories'
     paginate_by = 20
+    replica_reads = True
 
     def get_queryset(self):
         sort = self.request.GET.get('sort', 'name')
         direction = self.request.GET.get('dir', 'asc')
         q = self.request.GET.get('q')
+        # numbers come from the materialized CategoryRollup (see distribution.rollups)
         qs = (
             Category.objects
             .annotate(
-                books_count=Count('books', distinct=True),
+                books_count=Coalesce('rollup__book_count', Value(0)),
                 total_expense=Coalesce(
-                    Sum('books__distribution_expenses', output_field=DecimalField()),
+                    'rollup__total_expense',
                     Value(0),
                     output_field=DecimalField()
                 )
@@ -53,6 +69,7 @@ class CategoryListView(LoginRequiredMixin, AuditLoggingMixin, ListView):
         ctx = super().get_context_data(**kwargs)
         qs = self.request.GET.copy()
         qs.pop('page', None)
+        qs.pop('cursor', None)
         ctx['querystring'] = qs.urlencode()
         ctx['sort'] = self.request.GET.get('sort', 'name')
         ctx['dir'] = self.request.GET.get('dir', 'asc')
@@ -80,12 +97,14 @@ class CategoryDeleteView(LoginRequiredMixin, AdminReadOnlyEnforcementMixin, Audi
     template_name = 'distribution/category_confirm_delete.html'
     success_url = reverse_lazy('distribution:category_list')
 
+# category names listed in the "skipped" message before it is cut short
+SKIPPED_NAMES_SHOWN = 10
+
+
 @login_required
 @require_POST
 def bulk_delete_categories(request):
     ids = request.POST.getlist('selected')
-    deleted = 0
-    skipped = 0
     if ids:
         qs = Category.objects.filter(pk__in=ids)
         # Superusers can delete any categories
@@ -102,16 +121,14 @@ def bulk_delete_categories(request):
                     if nxt:
                         url = f"{url}?{nxt}"
                     return redirect(url)
-        for c in qs:
-            try:
-                c.delete()
-                deleted += 1
-            except ProtectedError:
-                skipped += 1
+        deleted, skipped = delete_empty_categories(qs)
         if deleted:
             messages.success(request, f"Deleted {deleted} categor(y/ies)")
         if skipped:
-            messages.info(request, f"Skipped {skipped} category(ies) that have related books")
+            shown = ', '.join(skipped[:SKIPPED_NAMES_SHOWN])
+            if len(skipped) > SKIPPED_NAMES_SHOWN:
+                shown += f" and {len(skipped) - SKIPPED_NAMES_SHOWN} more"
+            messages.info(request, f"Skipped {len(skipped)} category(ies) that have related books: {shown}")
     else:
         messages.info(request, "No categories selected")
     nxt = request.POST.get('next', '')
@@ -120,15 +137,45 @@ def bulk_delete_categories(request):
         url = f"{url}?{nxt}"
     return redirect(url)
     
-class BookListView(LoginRequiredMixin, AuditLoggingMixin, ListView):
+# query parameters that narrow the book list (sorting and paging aside)
+BOOK_FILTER_PARAMS = ('q', 'category', 'start', 'end')
+
+
+def filter_books(qs, params, search=None):
+    """
+    Applies the book list's filters (search, category, publishing date range) from
+    `params` to `qs`.
+    """
+    q = params.get('q')
+    cat = params.get('category')
+    start = params.get('start')
+    end = params.get('end')
+    if q:
+        qs = (search or get_search_backend(qs.db)).filter(qs, q)
+    if cat:
+        qs = qs.filter(category_id=cat)
+    if start:
+        qs = qs.filter(publishing_date__gte=start)
+    if end:
+        qs = qs.filter(publishing_date__lte=end)
+    return qs
+
+
+class BookListView(LoginRequiredMixin, AuditLoggingMixin, KeysetPaginationMixin, ListView):
     model = Book
     template_name = 'distribution/book_list.html'
     context_object_name = 'books'
     paginate_by = 20
+    replica_reads = True
 
     def get_queryset(self):
-        # Determine sort field and direction
-        sort = self.request.GET.get('sort', 'title')
+        q = self.request.GET.get('q')
+        search = get_search_backend() if q else None
+        # Determine sort field and direction; searches default to relevance when ranked
+        sort = self.request.GET.get('sort')
+        if not sort:
+            sort = 'relevance' if search and search.rank_ordering else 'title'
+        self.sort = sort
         direction = self.request.GET.get('dir', 'asc')
         sort_map = {
             'title': 'title',
@@ -140,28 +187,23 @@ class BookListView(LoginRequiredMixin, AuditLoggingMixin, ListView):
         }
         order_field = sort_map.get(sort, 'title')
         order_by = order_field if direction != 'desc' else f'-{order_field}'
+        if sort == 'relevance' and search and search.rank_ordering:
+            order_by = search.rank_ordering
 
-        qs = Book.objects.select_related('category')
-        q = self.request.GET.get('q')
-        cat = self.request.GET.get('category')
-        start = self.request.GET.get('start')
-        end = self.request.GET.get('end')
-        if q:
-            qs = qs.filter(Q(title__icontains=q) | Q(author__icontains=q) | Q(publisher__icontains=q))
-        if cat:
-            qs = qs.filter(category_id=cat)
-        if start:
-            qs = qs.filter(publishing_date__gte=start)
-        if end:
-            qs = qs.filter(publishing_date__lte=end)
+        qs = filter_books(Book.objects.select_related('category'), self.request.GET, search)
         return qs.order_by(order_by)
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        ctx['categories'] = Category.objects.order_by('name')
+        ctx['categories'] = category_choices()
+        if ctx['categories'] is None:
+            ctx['category_filter'] = CategoryTypeaheadInput(
+                attrs={'class': 'form-control form-control-sm', 'placeholder': 'All Categories'},
+            ).render('category', self.request.GET.get('category'))
         # preserve filters for pagination links
         qs = self.request.GET.copy()
         qs.pop('page', None)
+        qs.pop('cursor', None)
         ctx['querystring'] = qs.urlencode()
         ctx['filters'] = {
             'q': self.request.GET.get('q', ''),
@@ -170,10 +212,26 @@ class BookListView(LoginRequiredMixin, AuditLoggingMixin, ListView):
             'end': self.request.GET.get('end', ''),
         }
         # expose current sort state to template
-        ctx['sort'] = self.request.GET.get('sort', 'title')
+        ctx['sort'] = self.sort
         ctx['dir'] = self.request.GET.get('dir', 'asc')
         return ctx
     
+class BookExportView(BookListView):
+    """
+    Streams every book matching the list's current filters and sort as CSV or XLSX
+    (?format=), in the importer's column layout.
+    """
+
+    def get(self, request, *args, **kwargs):
+        fmt = request.GET.get('format', 'csv')
+        if fmt not in EXPORT_FORMATS:
+            return HttpResponseBadRequest('Unknown export format.')
+        writer, content_type, extension = EXPORT_FORMATS[fmt]
+        response = StreamingHttpResponse(writer(iter_export_rows(self.get_queryset())), content_type=content_type)
+        filename = f"books-{timezone.localdate():%Y%m%d}.{extension}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+    
 class BookCreateView(SuccessMessageMixin, LoginRequiredMixin, AdminReadOnlyEnforcementMixin, AuditLoggingMixin, CreateView):
     model = Book
     form_class = BookForm
@@ -196,93 +254,171 @@ class BookDeleteView(LoginRequiredMixin, AdminReadOnlyEnforcementMixin, AuditLog
 class BookDetailView(LoginRequiredMixin, AuditLoggingMixin, DetailView):
     model = Book
     template_name = 'distribution/book_details.html'
+    replica_reads = True
     
 class ExpensesReportView(LoginRequiredMixin, TemplateView):
     template_name = 'distribution/expenses_report.html'
     
+def _report_dates(request):
+    """
+    Returns (start, end) dates from ?start_date=&end_date=, or raises ValueError.
+    """
+    dates = []
+    for param in ('start_date', 'end_date'):
+        raw = request.GET.get(param) or ''
+        try:
+            value = parse_date(raw)
+        except ValueError:
+            value = None
+        if raw and value is None:
+            raise ValueError('Dates must be YYYY-MM-DD.')
+        dates.append(value)
+    return tuple(dates)
+
+def _cached_report_response(request, name, params, compute):
+    if reading_from_replica():
+        # the version may already be bumped for a write the replica hasn't applied yet;
+        # a validator would keep a stale body in the browser until the next write
+        return JsonResponse(cached_report(name, params, compute), safe=False)
+    # the browser revalidates every load; unchanged data costs a 304 and no query
+    etag = quote_etag(report_etag(name, params))
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        count_report_event(REPORT_NOT_MODIFIED_KEY)
+        return not_modified
+    response = JsonResponse(cached_report(name, params, compute), safe=False)
+    response['ETag'] = etag
+    return response
+
+@replica_reads
 @login_required
+@cache_control(private=True, no_cache=True)
 def expenses_by_category_json(request):
-    start = request.GET.get('start_date')
-    end = request.GET.get('end_date')
-    qs = Book.objects.all()
-    if start:
-        qs = qs.filter(publishing_date__gte=start)
-    if end:
-        qs = qs.filter(publishing_date__lte=end)
-    agg = (
-        qs.values('category__id', 'category__name')
-          .annotate(total=Sum('distribution_expenses'))
-          .order_by('-total')
-    )
-    data = [
-        {
-            'category': r['category__name'] or 'Uncategorized',
-            'total': float(r['total'] or 0),
-        }
-        for r in agg
-    ]
-    return JsonResponse(data, safe=False)
+    try:
+        start, end = _report_dates(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    def compute():
+        return [
+            {'category': name, 'total': float(total)}
+            for name, total in expense_totals_by_category(start, end)
+        ]
+
+    return _cached_report_response(request, 'expenses_by_category', (start, end), compute)
+
+@replica_reads
+@login_required
+@cache_control(private=True, no_cache=True)
+def expense_analytics_json(request):
+    """
+    ?group_by=category,month&start_date=&end_date=&category=<id>&top=<n>
+    Totals are serialized as decimal strings.
+    """
+    try:
+        start, end = _report_dates(request)
+        group_by = [g.strip() for g in request.GET.get('group_by', 'category').split(',') if g.strip()]
+        category_id = int(request.GET['category']) if request.GET.get('category') else None
+        top = int(request.GET['top']) if request.GET.get('top') else None
+        if top is not None and top < 1:
+            raise ValueError('top must be a positive number.')
+        params = (','.join(group_by), start, end, category_id, top)
+        return _cached_report_response(
+            request, 'expense_analytics', params,
+            lambda: expense_analytics(group_by, start, end, category_id=category_id, top=top),
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+@staff_member_required
+def report_cache_stats_json(request):
+    return JsonResponse(report_cache_stats())
+
+@replica_reads
+@login_required
+def category_search_json(request):
+    """
+    ?q=<text>&limit=<n>, for the category type-ahead.
+    """
+    try:
+        limit = int(request.GET['limit']) if request.GET.get('limit') else None
+    except ValueError:
+        return JsonResponse({'error': 'limit must be a number.'}, status=400)
+    if limit is not None and limit < 1:
+        return JsonResponse({'error': 'limit must be a positive number.'}, status=400)
+    results = search_categories(request.GET.get('q', ''), limit)
+    return JsonResponse({'results': [{'id': pk, 'name': name} for pk, name in results]})
+
+def _import_jobs_for(user):
+    jobs = ImportJob.objects.all()
+    if not user.is_superuser:
+        jobs = jobs.filter(created_by=user)
+    return jobs
+
 
 @staff_member_required
 def import_books_view(request):
     """
-    Simple upload view for staff to upload Excel/CSV and import books.
+    Upload view for staff: stores the Excel/CSV file as an ImportJob and hands it to
+    the background worker, then redirects to the job's progress page.
     """
-    
+
     if request.method == 'POST':
         form = UploadBooksForm(request.POST, request.FILES)
         if form.is_valid():
             upload = form.cleaned_data['file']
-            try:
-                result = import_books_from_filelike(upload, filename=upload.name, created_by=request.user)
-            except ValueError as e:
-                messages.error(request, f'Upload failed: {e}')
-                return redirect(reverse('distribution:import_books'))
-            except Exception as exc:
-                messages.error(request, f'Unexpected error: {exc}')
-                return redirect(reverse('distribution:import_books'))
-            
-            created = result.get('created', 0)
-            updated = result.get('updated', 0)
-            skipped = result.get('skipped', 0)
-            errors = result.get('errors', [])
-            
-            msg = f'Import finished -- Created: {created}, Updated: {updated}, Skipped: {skipped}'
-            messages.success(request, msg)
-            if errors:
-                messages.error(request, f'Errors: {len(errors)} rows had problems -- check servre logs for details.')
-            return redirect(reverse('distribution:import_books'))
+            job = ImportJob.objects.create(file=upload, filename=upload.name, created_by=request.user)
+            enqueue_import_job(job)
+            messages.success(request, f'Import of {upload.name} queued.')
+            return redirect(reverse('distribution:import_job_detail', args=[job.pk]))
     else:
         form = UploadBooksForm()
-            
-    return render(request, 'distribution/import_books.html', {'form': form})
+
+    recent_jobs = _import_jobs_for(request.user).select_related('created_by')[:10]
+    return render(request, 'distribution/import_books.html', {'form': form, 'recent_jobs': recent_jobs})
+
+@staff_member_required
+def import_job_detail(request, pk):
+    job = get_object_or_404(_import_jobs_for(request.user), pk=pk)
+    return render(request, 'distribution/import_job_detail.html', {'job': job})
+
+@staff_member_required
+def import_job_progress(request, pk):
+    job = get_object_or_404(_import_jobs_for(request.user), pk=pk)
+    requeue_if_stale(job)
+    return JsonResponse(job.as_progress())
 
 @login_required
 @require_POST
 def bulk_delete_books(request):
     ids = request.POST.getlist('selected')
-    count = 0
-    if ids:
-        qs = Book.objects.filter(pk__in=ids)
-        # Superusers can delete any records
-        if request.user.is_superuser:
-            pass
+    qs = None
+    if request.POST.get('scope') == 'filtered':
+        # every book matching the list filters the form was submitted from
+        params = QueryDict(request.POST.get('next', ''))
+        if any(params.get(p) for p in BOOK_FILTER_PARAMS):
+            qs = filter_books(Book.objects.all(), params)
         else:
-            # Admins/staff can only delete records they created; block if any belong to another admin
-            if is_admin(request.user) or request.user.is_staff:
-                forbidden = qs.filter(~Q(created_by_id=request.user.id), ~Q(created_by_id__isnull=True)).exists()
-                if forbidden:
-                    messages.error(request, "Read-only for your role: you cannot delete records created by another admin.")
-                    nxt = request.POST.get('next', '')
-                    url = reverse('distribution:book_list')
-                    if nxt:
-                        url = f"{url}?{nxt}"
-                    return redirect(url)
-        count = qs.count()
-        qs.delete()
-        messages.success(request, f"Deleted {count} book(s)")
+            messages.error(request, "Apply a filter before deleting all matching books.")
+    elif ids:
+        qs = Book.objects.filter(pk__in=ids)
     else:
         messages.info(request, "No books selected")
+    if qs is not None:
+        # Superusers can delete any records; everyone else only records they created (or
+        # unowned ones), whether they picked rows or asked for everything matching
+        if not request.user.is_superuser:
+            others = ~Q(created_by_id=request.user.id) & Q(created_by_id__isnull=False)
+            forbidden = qs.aggregate(n=Count('pk', filter=others))['n']
+            if forbidden:
+                messages.error(request, "Read-only for your role: you cannot delete records created by another admin.")
+                nxt = request.POST.get('next', '')
+                url = reverse('distribution:book_list')
+                if nxt:
+                    url = f"{url}?{nxt}"
+                return redirect(url)
+        count = delete_books(qs)
+        messages.success(request, f"Deleted {count} book(s)")
     nxt = request.POST.get('next', '')
     url = reverse('distribution:book_list')
     if nxt:
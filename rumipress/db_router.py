@@ -0,0 +1,105 @@
+# rumipress/db_router.py
+"""
+Read-replica routing.
+
+Views marked with `replica_reads` (a class attribute on class-based views, a decorator
+on function views) read from the REPLICA_DATABASE alias for GET/HEAD requests, the
+template rendering included; everything else, and every write, uses the primary.
+
+Replication lags a little, so a user who just wrote something would not see it on the
+replica: ReplicaRoutingMiddleware sets a short-lived cookie on every unsafe request
+and while it is present that user's requests read from the primary too
+(REPLICA_STICKY_SECONDS).
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+STICKY_COOKIE = 'db_primary'
+DEFAULT_REPLICA_STICKY_SECONDS = 10
+
+_read_alias = ContextVar('read_alias', default=None)
+
+
+def replica_alias():
+    """
+    Returns the configured replica alias, or None when reads all go to the primary.
+    """
+    alias = getattr(settings, 'REPLICA_DATABASE', None)
+    return alias if alias and alias in settings.DATABASES else None
+
+
+def reading_from_replica():
+    return _read_alias.get() is not None
+
+
+@contextmanager
+def read_from_replica():
+    """
+    Routes the reads made inside the block to the replica (if one is configured).
+    """
+    token = _read_alias.set(replica_alias())
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def replica_reads(view_func):
+    view_func.replica_reads = True
+    return view_func
+
+
+def is_sticky(request):
+    return STICKY_COOKIE in request.COOKIES
+
+
+class ReplicaRouter:
+    """
+    Sends reads to the replica inside read_from_replica(), everything else to the
+    primary; migrations only run on the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replica holds the same rows, so objects loaded from either may be related
+        return {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, replica_alias()}
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != replica_alias()
+
+
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request._replica_token = None
+        try:
+            response = self.get_response(request)
+        finally:
+            if request._replica_token is not None:
+                _read_alias.reset(request._replica_token)
+        if request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE') and replica_alias():
+            response.set_cookie(
+                STICKY_COOKIE, '1', httponly=True, samesite='Lax',
+                max_age=getattr(settings, 'REPLICA_STICKY_SECONDS', DEFAULT_REPLICA_STICKY_SECONDS),
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = getattr(view_func, 'view_class', view_func)
+        if (
+            getattr(view, 'replica_reads', False)
+            and request.method in ('GET', 'HEAD')
+            and replica_alias()
+            and not is_sticky(request)
+        ):
+            request._replica_token = _read_alias.set(replica_alias())
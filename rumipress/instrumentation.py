@@ -0,0 +1,145 @@
+# rumipress/instrumentation.py
+"""
+Per-request query and latency instrumentation.
+
+RequestTimingMiddleware wraps every database connection with an execute_wrapper for
+the duration of a request and records the number of queries, the time spent in the
+database, the template render time (TemplateResponse views) and the total time (up to
+the first byte for streaming responses).
+
+- With SERVER_TIMING_HEADER on, the numbers are sent back as a Server-Timing header
+  (visible in the browser dev tools).
+- The last REQUEST_STATS_SAMPLES requests per URL name are kept in process memory;
+  request_stats() summarizes them (p50/p95) for the superuser stats endpoint.
+- QUERY_BUDGETS maps URL names to a maximum query count (QUERY_BUDGET_DEFAULT for
+  the rest); a request over budget is logged, or raises QueryBudgetExceeded when
+  QUERY_BUDGET_ACTION is 'raise' (as rumipress.test_settings sets it), failing the test.
+"""
+import logging
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REQUEST_STATS_SAMPLES = 500
+
+_stats = defaultdict(deque)
+_stats_lock = threading.Lock()
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_started = None
+        self.render_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+    def server_timing(self, total):
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+            f'render;dur={self.render_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+
+def query_budget(url_name):
+    return getattr(settings, 'QUERY_BUDGETS', {}).get(url_name, getattr(settings, 'QUERY_BUDGET_DEFAULT', None))
+
+
+def record_request(url_name, total, db_time, queries):
+    samples = getattr(settings, 'REQUEST_STATS_SAMPLES', DEFAULT_REQUEST_STATS_SAMPLES)
+    with _stats_lock:
+        entries = _stats[url_name]
+        if entries.maxlen != samples:
+            entries = _stats[url_name] = deque(entries, maxlen=samples)
+        entries.append((total, db_time, queries))
+
+
+def _percentile(values, fraction):
+    # nearest rank on the sorted values
+    values = sorted(values)
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def request_stats():
+    """
+    Returns {url name: summary} over the recorded samples, times in milliseconds.
+    """
+    with _stats_lock:
+        snapshot = {name: list(entries) for name, entries in _stats.items() if entries}
+    summary = {}
+    for name, entries in sorted(snapshot.items()):
+        totals, db_times, queries = zip(*entries)
+        summary[name] = {
+            'requests': len(entries),
+            'total_ms_p50': round(_percentile(totals, 0.5) * 1000, 1),
+            'total_ms_p95': round(_percentile(totals, 0.95) * 1000, 1),
+            'db_ms_p50': round(_percentile(db_times, 0.5) * 1000, 1),
+            'db_ms_p95': round(_percentile(db_times, 0.95) * 1000, 1),
+            'queries_p50': _percentile(queries, 0.5),
+            'queries_p95': _percentile(queries, 0.95),
+            'queries_max': max(queries),
+            'query_budget': query_budget(name),
+        }
+    return summary
+
+
+def reset_request_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+class RequestTimingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = request._metrics = RequestMetrics()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(metrics))
+            response = self.get_response(request)
+        total = time.perf_counter() - metrics.started
+        match = getattr(request, 'resolver_match', None)
+        url_name = match.view_name if match else '<unresolved>'
+        record_request(url_name, total, metrics.db_time, metrics.queries)
+        if getattr(settings, 'SERVER_TIMING_HEADER', False):
+            response['Server-Timing'] = metrics.server_timing(total)
+        budget = query_budget(url_name)
+        if budget is not None and metrics.queries > budget:
+            message = f'{url_name} ran {metrics.queries} queries (budget {budget}) for {request.method} {request.path}'
+            if getattr(settings, 'QUERY_BUDGET_ACTION', 'log') == 'raise':
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def process_template_response(self, request, response):
+        # called just before the response is rendered
+        metrics = getattr(request, '_metrics', None)
+        if metrics is not None:
+            metrics.render_started = time.perf_counter()
+            response.add_post_render_callback(lambda r: self._rendered(metrics))
+        return response
+
+    @staticmethod
+    def _rendered(metrics):
+        metrics.render_time += time.perf_counter() - metrics.render_started
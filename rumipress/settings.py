@@ -43,11 +43,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'rumipress.instrumentation.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.RoleMiddleware',
+    'rumipress.db_router.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -79,12 +82,71 @@ WSGI_APPLICATION = 'rumipress.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_ENGINE=postgresql (needs psycopg; psycopg[pool] for DB_POOL) or sqlite (default).
+if os.environ.get('DB_ENGINE', 'sqlite') == 'postgresql':
+    DB_POOL = os.environ.get('DB_POOL', 'false').lower() == 'true'
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'rumipress'),
+            'USER': os.environ.get('DB_USER', ''),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', ''),
+            'PORT': os.environ.get('DB_PORT', ''),
+            # persistent connections, checked before reuse; a pool manages its own
+            'CONN_MAX_AGE': 0 if DB_POOL else int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+                    'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+                    'timeout': int(os.environ.get('DB_POOL_TIMEOUT', '10')),
+                },
+            } if DB_POOL else {},
+        }
     }
-}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', str(BASE_DIR / 'db.sqlite3')),
+            'OPTIONS': {
+                # WAL lets readers run alongside a writer (e.g. an import); NORMAL sync is
+                # safe under WAL; mmap speeds up reads of a large file
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    f"PRAGMA mmap_size={int(os.environ.get('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))};"
+                    'PRAGMA temp_store=MEMORY;'
+                ),
+                # seconds a writer waits for the lock instead of failing with "database is locked"
+                'timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', '20')),
+                # take the write lock when a transaction starts, so the busy timeout applies
+                # (a deferred transaction upgrading to a writer fails at once)
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
+    }
+
+# Read replica: DB_REPLICA_NAME (SQLite file or PostgreSQL database, with DB_REPLICA_HOST/
+# DB_REPLICA_PORT overriding the primary's) adds a 'replica' alias that the list, detail
+# and report views read from (see rumipress/db_router.py). Keeping it in sync is up to
+# the database's replication.
+REPLICA_DATABASE = None
+if os.environ.get('DB_REPLICA_NAME'):
+    REPLICA_DATABASE = 'replica'
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ['DB_REPLICA_NAME'],
+        'HOST': os.environ.get('DB_REPLICA_HOST', DATABASES['default'].get('HOST', '')),
+        'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default'].get('PORT', '')),
+    }
+DATABASE_ROUTERS = ['rumipress.db_router.ReplicaRouter']
+# Seconds a user's requests keep reading from the primary after they write something,
+# so they see their own changes while the replica catches up
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', '10'))
+# Upper bound on how long a report computed from the replica stays cached
+REPLICA_REPORT_CACHE_SECONDS = int(os.environ.get('REPLICA_REPORT_CACHE_SECONDS', '60'))
 
 
 # Password validation
@@ -123,6 +185,10 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+# Uploaded files (book import jobs)
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -145,3 +211,67 @@ else:
 LOGIN_URL = '/accounts/login/'
 LOGIN_REDIRECT_URL = '/distribution/books/'
 LOGOUT_REDIRECT_URL = '/accounts/login/'
+
+# Book imports run as background jobs in a local thread pool
+BOOK_IMPORT_WORKERS = int(os.environ.get('BOOK_IMPORT_WORKERS', '1'))
+# A running job that has not reported progress for this many seconds is treated as
+# abandoned (its worker died) and is run again
+IMPORT_JOB_STALE_SECONDS = int(os.environ.get('IMPORT_JOB_STALE_SECONDS', '900'))
+
+# List views: 'offset' (numbered pages) or 'cursor' (keyset pages, constant cost per page)
+LIST_PAGINATION = os.environ.get('LIST_PAGINATION', 'offset')
+# Seconds a list's total row count is cached in cursor mode; 0 hides the total
+LIST_COUNT_CACHE_SECONDS = int(os.environ.get('LIST_COUNT_CACHE_SECONDS', '60'))
+
+# Cache: local memory by default; point CACHE_BACKEND/CACHE_LOCATION at e.g.
+# django.core.cache.backends.redis.RedisCache + redis://host:6379/0 (or the file-based
+# backend) so every worker process shares entries and invalidations
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'rumipress'),
+    }
+}
+# Seconds a computed report response is kept; entries also go stale on any book/category write
+REPORT_CACHE_SECONDS = int(os.environ.get('REPORT_CACHE_SECONDS', '3600'))
+# Seconds the (id, name) category list behind the book filter and form is cached; any
+# category write invalidates it. Past CATEGORY_SELECT_LIMIT categories the pages use a
+# type-ahead box instead of a <select>
+CATEGORY_CHOICES_CACHE_SECONDS = int(os.environ.get('CATEGORY_CHOICES_CACHE_SECONDS', '3600'))
+CATEGORY_SELECT_LIMIT = int(os.environ.get('CATEGORY_SELECT_LIMIT', '1000'))
+
+# Audit events are queued and written in batches by a background thread
+AUDIT_LOG_BUFFERED = os.environ.get('AUDIT_LOG_BUFFERED', 'true').lower() == 'true'
+AUDIT_LOG_BUFFER_SIZE = int(os.environ.get('AUDIT_LOG_BUFFER_SIZE', '10000'))
+AUDIT_LOG_BATCH_SIZE = int(os.environ.get('AUDIT_LOG_BATCH_SIZE', '200'))
+AUDIT_LOG_FLUSH_SECONDS = float(os.environ.get('AUDIT_LOG_FLUSH_SECONDS', '2'))
+# Audit rows older than this many days are removed by `manage.py prune_audit_log`
+# (or moved to AUDIT_LOG_ARCHIVE_DIR by `archive_audit_log`); 0 keeps everything
+AUDIT_LOG_RETENTION_DAYS = int(os.environ.get('AUDIT_LOG_RETENTION_DAYS', '365'))
+AUDIT_LOG_PRUNE_BATCH_SIZE = int(os.environ.get('AUDIT_LOG_PRUNE_BATCH_SIZE', '5000'))
+AUDIT_LOG_ARCHIVE_DIR = os.environ.get('AUDIT_LOG_ARCHIVE_DIR', str(BASE_DIR / 'archive'))
+# Seconds a user's group names are cached between requests (0: looked up once per request);
+# group and membership changes invalidate them
+ROLE_CACHE_SECONDS = int(os.environ.get('ROLE_CACHE_SECONDS', '0'))
+
+# Request instrumentation (rumipress/instrumentation.py): Server-Timing headers, per-URL
+# stats at /stats/requests/ and query budgets per URL name
+SERVER_TIMING_HEADER = os.environ.get('SERVER_TIMING_HEADER', str(DEBUG)).lower() == 'true'
+REQUEST_STATS_SAMPLES = int(os.environ.get('REQUEST_STATS_SAMPLES', '500'))
+QUERY_BUDGETS = {
+    'distribution:book_list': 12,
+    'distribution:category_list': 10,
+    'distribution:expenses_by_category_json': 8,
+    'distribution:expense_analytics_json': 8,
+    'distribution:import_job_progress': 6,
+    'distribution:category_search_json': 6,
+}
+QUERY_BUDGET_DEFAULT = None
+# 'log' a warning, or 'raise' QueryBudgetExceeded (the test settings do, so tests fail
+# on regressions)
+QUERY_BUDGET_ACTION = os.environ.get('QUERY_BUDGET_ACTION', 'log')
+
+# Tests run with rumipress.test_settings (manage.py test picks it); the runner refuses
+# to start under these settings
+TESTING = False
+TEST_RUNNER = 'rumipress.test_runner.TestRunner'
@@ -0,0 +1,19 @@
+# rumipress/test_runner.py
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """
+    DiscoverRunner that refuses to run under the production settings, where tests
+    would silently get buffered audit writes and logged query budgets.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        if not getattr(settings, 'TESTING', False):
+            raise ImproperlyConfigured(
+                'Run the tests with DJANGO_SETTINGS_MODULE=rumipress.test_settings '
+                '(manage.py test does this by default).'
+            )
+        super().setup_test_environment(**kwargs)
@@ -0,0 +1,21 @@
+# rumipress/test_settings.py
+"""
+Settings for the test suite: the production settings with the behaviour tests rely on.
+
+`manage.py test` uses this module by default; point DJANGO_SETTINGS_MODULE at it for
+any other runner.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES
+
+TESTING = True
+
+# audit events are written inline, so they land in the test transaction
+AUDIT_LOG_BUFFERED = False
+# a request over its query budget fails the test
+QUERY_BUDGET_ACTION = 'raise'
+
+# a mirror of 'default', so the replica routing can be exercised; routing stays off
+# unless a test turns REPLICA_DATABASE on
+DATABASES['replica'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+REPLICA_DATABASE = None
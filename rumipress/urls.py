@@ -31,4 +31,6 @@ urlpatterns = [
     path('accounts/logout/', views.logout_redirect, name='logout_redirect'),
     path('accounts/', include('django.contrib.auth.urls')),
     path('accounts/', include(('accounts.urls', 'accounts'), namespace='accounts')),
+    # Per-URL query counts and latency percentiles for this process (superusers)
+    path('stats/requests/', views.request_stats_json, name='request_stats'),
 ]
@@ -0,0 +1,40 @@
+# rumipress/versioning.py
+"""
+Version stamps for cache invalidation.
+
+A cached entry is stored under the current version of its stamp (`version=` on the
+cache calls); bumping the stamp makes every entry stored under it stale at once, with
+no need to know their keys. Used by the report cache, the role cache and the category
+choices. Use a shared cache backend with several worker processes so a bump reaches
+all of them.
+"""
+from django.core.cache import cache
+from django.db import transaction
+
+
+def cache_version(key):
+    """
+    Returns the current version stored at `key`, starting it at 1.
+    """
+    version = cache.get(key)
+    if version is None:
+        # add() so concurrent first requests agree on the initial stamp
+        cache.add(key, 1, None)
+        version = cache.get(key, 1)
+    return version
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 2, None)
+
+
+def bump_cache_version(key):
+    """
+    Bumps the version at `key` now and again once the current transaction commits (an
+    entry computed meanwhile may have read the pre-commit rows).
+    """
+    _bump(key)
+    transaction.on_commit(lambda: _bump(key))
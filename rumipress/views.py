@@ -1,6 +1,9 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth import logout
+from django.contrib.auth.decorators import user_passes_test
+from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
+from .instrumentation import request_stats
 
 def  home(request):
     return render(request, 'home.html')
@@ -8,4 +11,8 @@ def  home(request):
 @require_http_methods(["GET", "POST"]) 
 def logout_redirect(request):
     logout(request)
-    return redirect('/accounts/login/')
\ No newline at end of file
+    return redirect('/accounts/login/')
+
+@user_passes_test(lambda u: u.is_superuser)
+def request_stats_json(request):
+    return JsonResponse(request_stats())